@@ -0,0 +1,242 @@
+"""
+File: journal.py
+Description:
+Write-ahead log for the phone network. Every change (switch-add, switch-connect, phone-add,
+calls starting and ending) is appended to a log file as it happens and flushed to disk in
+batches. Every so often the whole network is written as a binary snapshot (a checkpoint) and
+older log files are removed, so recovery loads the latest checkpoint and replays only the
+log written after it. Restart time is then bounded however long the network has been running.
+
+Files in the journal directory:
+    checkpoint-<sequence>.snap  snapshot of the network after record <sequence>
+    wal-<sequence>.log          records after <sequence>, one per line: "<sequence> <command...>"
+"""
+import argparse
+import os
+import threading
+import time
+
+from network import Network, SWITCH_ADD, SWITCH_CONNECT, PHONE_ADD, CALL, HANG_UP
+
+CHECKPOINT_PREFIX = 'checkpoint-'
+CHECKPOINT_SUFFIX = '.snap'
+LOG_PREFIX = 'wal-'
+LOG_SUFFIX = '.log'
+
+# flush to disk after this many records, and every this many seconds while records are waiting
+SYNC_EVERY = 256
+SYNC_INTERVAL = 0.05
+# write a checkpoint after this many records
+CHECKPOINT_EVERY = 1000000
+
+
+def _sequence_of(name, prefix, suffix):
+    # sequence number in a journal file name, or None if the name is not one of ours
+    if name.startswith(prefix) and name.endswith(suffix):
+        number = name[len(prefix):len(name) - len(suffix)]
+        if number.isdigit():
+            return int(number)
+    return None
+
+
+def _files(directory, prefix, suffix):
+    # (sequence, path) of every journal file of one kind, oldest first
+    found = []
+    for name in os.listdir(directory):
+        sequence = _sequence_of(name, prefix, suffix)
+        if sequence is not None:
+            found.append((sequence, os.path.join(directory, name)))
+    return sorted(found)
+
+
+def _file_name(directory, prefix, sequence, suffix):
+    return os.path.join(directory, prefix + '{:012d}'.format(sequence) + suffix)
+
+
+def apply_record(network, fields):
+    """
+    Applies one log record (the command and its integer arguments) to the network
+    """
+    command = fields[0]
+    args = [int(field) for field in fields[1:]]
+    if command == SWITCH_ADD:
+        network.add_switchboard(args[0])
+    elif command == SWITCH_CONNECT:
+        network.connect_switchboards(args[0], args[1], args[2] if len(args) == 3 else None)
+    elif command == PHONE_ADD:
+        network.searchSwitchboards(args[0]).add_phones([args[1]])
+    elif command == CALL:
+        phone = network.searchSwitchboards(args[0]).findPhone(args[1])
+        other = network.searchSwitchboards(args[2]).findPhone(args[3])
+        # the call goes back over exactly the trunks it held
+        network.restore_call(phone, other, args[4:])
+    elif command == HANG_UP:
+        network.searchSwitchboards(args[0]).findPhone(args[1]).hang_up()
+    else:
+        raise ValueError("Unknown journal record: " + command)
+
+
+def recover(directory):
+    """
+    Rebuilds the network from the latest checkpoint and the log records written after it.
+    A half-written last line (from a crash mid-write) is cut off the log file, so records
+    appended after recovery start on a line of their own.
+    :return: (network, sequence number of the last record applied)
+    """
+    network = Network()
+    sequence = 0
+    checkpoints = _files(directory, CHECKPOINT_PREFIX, CHECKPOINT_SUFFIX)
+    if checkpoints:
+        sequence, path = checkpoints[-1]
+        network.load_snapshot(path)
+    for _, path in _files(directory, LOG_PREFIX, LOG_SUFFIX):
+        with open(path, 'rb+') as file:
+            offset = 0
+            for line in file:
+                if not line.endswith(b'\n'):
+                    # torn write at the end of the log
+                    file.truncate(offset)
+                    break
+                offset += len(line)
+                fields = line.decode().split()
+                record = int(fields[0])
+                if record <= sequence:
+                    # already part of the checkpoint
+                    continue
+                apply_record(network, fields[1:])
+                sequence = record
+    return network, sequence
+
+
+class WriteAheadLog:
+    """
+    This class appends every change made to a network to a log file, syncing to disk in
+    batches, and writes periodic checkpoints. Attach it with attach() or open_network().
+    A background thread syncs records left waiting for sync_interval seconds, so a quiet
+    period after a burst doesn't leave them in memory
+    """
+    def __init__(self, network, directory, sequence=0, sync_every=SYNC_EVERY,
+                 sync_interval=SYNC_INTERVAL, checkpoint_every=CHECKPOINT_EVERY, include_calls=True):
+        self.network = network
+        self.directory = directory
+        self.sequence = sequence
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.checkpoint_every = checkpoint_every
+        self.include_calls = include_calls
+        self._unsynced = 0
+        self._since_checkpoint = 0
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(_file_name(directory, LOG_PREFIX, sequence, LOG_SUFFIX), 'a')
+        # the network records from its own thread while the timer syncs from another
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._timer = None
+        if sync_interval:
+            self._timer = threading.Thread(target=self._sync_periodically, daemon=True)
+            self._timer.start()
+
+    def attach(self):
+        """
+        Method to start recording the network's changes
+        """
+        self.network.journal = self
+        return self
+
+    def record(self, fields):
+        """
+        Method to append one change, called by the network after each mutation
+        """
+        with self._lock:
+            self.sequence += 1
+            self._file.write(str(self.sequence) + ' ' + ' '.join(str(field) for field in fields) + '\n')
+            self._unsynced += 1
+            self._since_checkpoint += 1
+            if self._unsynced >= self.sync_every:
+                self.sync()
+            if self.checkpoint_every and self._since_checkpoint >= self.checkpoint_every:
+                self.checkpoint()
+
+    def sync(self):
+        """
+        Method to flush buffered records and fsync them to disk
+        """
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def _sync_periodically(self):
+        # runs on the timer thread until close
+        while not self._closed.wait(self.sync_interval):
+            with self._lock:
+                if self._unsynced and not self._closed.is_set():
+                    self.sync()
+
+    def checkpoint(self):
+        """
+        Method to write a snapshot of the network, start a new log file and remove the
+        checkpoints and logs the new snapshot replaces
+        """
+        with self._lock:
+            self._checkpoint()
+
+    def _checkpoint(self):
+        self.sync()
+        path = _file_name(self.directory, CHECKPOINT_PREFIX, self.sequence, CHECKPOINT_SUFFIX)
+        # write under a temporary name and rename, so a crash never leaves half a checkpoint
+        temporary = path + '.tmp'
+        self.network.save_snapshot(temporary, self.include_calls)
+        with open(temporary, 'rb') as file:
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+
+        self._file.close()
+        self._file = open(_file_name(self.directory, LOG_PREFIX, self.sequence, LOG_SUFFIX), 'a')
+        for sequence, old in _files(self.directory, CHECKPOINT_PREFIX, CHECKPOINT_SUFFIX):
+            if sequence < self.sequence:
+                os.remove(old)
+        for sequence, old in _files(self.directory, LOG_PREFIX, LOG_SUFFIX):
+            if sequence < self.sequence:
+                os.remove(old)
+        self._since_checkpoint = 0
+
+    def close(self):
+        """
+        Method to sync the log and stop recording
+        """
+        self._closed.set()
+        if self._timer is not None:
+            self._timer.join()
+        self.sync()
+        self._file.close()
+        if self.network.journal is self:
+            self.network.journal = None
+
+
+def open_network(directory, **options):
+    """
+    Recovers the network kept in directory (an empty one if there is nothing there yet)
+    and attaches a write-ahead log to it. options are passed to WriteAheadLog
+    """
+    os.makedirs(directory, exist_ok=True)
+    network, sequence = recover(directory)
+    WriteAheadLog(network, directory, sequence, **options).attach()
+    return network
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recover and compact a network journal directory.')
+    parser.add_argument('directory', help='journal directory')
+    parser.add_argument('--checkpoint', action='store_true', help='write a new checkpoint after recovering')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    the_network, last = recover(args.directory)
+    print('Recovered {} switchboards up to record {} in {:.2f}s.'.format(
+        len(the_network.switchboards), last, time.perf_counter() - start))
+    if args.checkpoint:
+        journal = WriteAheadLog(the_network, args.directory, last).attach()
+        journal.checkpoint()
+        journal.close()
+        print('Checkpoint written.')
@@ -0,0 +1,190 @@
+"""
+File: metrics.py
+Description:
+Metrics for the phone network: counters, gauges and histograms kept in memory, cheap enough
+to update on every call, and written out as a Prometheus text exposition snapshot. A Network
+reports to a Metrics object by default, NullMetrics turns the reporting off, and any object
+with the same methods can take their place to send the numbers somewhere else.
+"""
+import bisect
+import os
+
+# histogram buckets: route lookup time in seconds, and route length in trunks
+SECONDS_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3, 1e-2)
+HOPS_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 32)
+
+# names of the network's metrics
+CALLS_ATTEMPTED = 'network_calls_attempted_total'
+CALLS_CONNECTED = 'network_calls_connected_total'
+CALLS_FAILED = 'network_calls_failed_total'
+CALLS_ENDED = 'network_calls_ended_total'
+ACTIVE_CALLS = 'network_active_calls'
+ROUTE_LOOKUPS = 'network_route_lookups_total'
+ROUTE_LOOKUP_SECONDS = 'network_route_lookup_seconds'
+ROUTE_HOPS = 'network_route_hops'
+PHONES = 'network_phones'
+SWITCHBOARDS = 'network_switchboards'
+TRUNKS = 'network_trunks'
+
+# reasons a call fails, used as the label of CALLS_FAILED
+NOT_CONNECTED = 'not_connected'
+BUSY = 'busy'
+BLOCKED = 'blocked'
+
+HELP = {
+    CALLS_ATTEMPTED: 'Calls started with start-call.',
+    CALLS_CONNECTED: 'Calls that were connected.',
+    CALLS_FAILED: 'Calls that were not connected, by reason.',
+    CALLS_ENDED: 'Calls that were hung up.',
+    ACTIVE_CALLS: 'Calls in progress.',
+    ROUTE_LOOKUPS: 'Routing table lookups made by connect_call.',
+    ROUTE_LOOKUP_SECONDS: 'Time connect_call took to find the destination switchboard.',
+    ROUTE_HOPS: 'Trunks crossed by each connected call.',
+    PHONES: 'Phones registered.',
+    SWITCHBOARDS: 'Switchboards in the network.',
+    TRUNKS: 'Trunk lines in the network.',
+}
+
+
+class Histogram:
+    """
+    This class counts observations into cumulative buckets and keeps their count and sum
+    """
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # one count per bucket plus one for values above the last bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Metrics:
+    """
+    This class keeps counters, gauges and histograms in memory. Names may carry Prometheus
+    labels, given as a dictionary
+    """
+    def __init__(self):
+        self.counters = {} # (name, labels) -> value
+        self.gauges = {} # (name, labels) -> value
+        self.histograms = {} # (name, labels) -> Histogram
+
+    @staticmethod
+    def _key(name, labels):
+        if not labels:
+            return name, ''
+        return name, ','.join('{}="{}"'.format(label, value) for label, value in sorted(labels.items()))
+
+    def increment(self, name, value=1, labels=None):
+        """
+        Method to add to a counter
+        """
+        key = self._key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, labels=None):
+        """
+        Method to set a gauge
+        """
+        self.gauges[self._key(name, labels)] = value
+
+    def add_gauge(self, name, value, labels=None):
+        """
+        Method to move a gauge up or down
+        """
+        key = self._key(name, labels)
+        self.gauges[key] = self.gauges.get(key, 0) + value
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, labels=None):
+        """
+        Method to add a value to a histogram, made with buckets the first time
+        """
+        key = self._key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def value(self, name, labels=None):
+        """
+        Method returning a counter or gauge, 0 if it was never set
+        """
+        key = self._key(name, labels)
+        return self.counters.get(key, self.gauges.get(key, 0))
+
+    def reset(self):
+        """
+        Method to clear every metric
+        """
+        self.counters.clear()
+        self.gauges.clear()
+        self.histograms.clear()
+
+    def prometheus_lines(self):
+        """
+        Method generating the metrics in the Prometheus text exposition format
+        """
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in HELP:
+                    yield '# HELP {} {}'.format(name, HELP[name])
+                yield '# TYPE {} {}'.format(name, kind)
+
+        def sample(name, labels, value):
+            return '{}{{{}}} {}'.format(name, labels, value) if labels else '{} {}'.format(name, value)
+
+        for kind, values in (('counter', self.counters), ('gauge', self.gauges)):
+            for (name, labels), value in sorted(values.items()):
+                yield from header(name, kind)
+                yield sample(name, labels, value)
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            yield from header(name, 'histogram')
+            cumulative = 0
+            prefix = labels + ',' if labels else ''
+            for bound, count in zip(histogram.bounds + ('+Inf',), histogram.counts):
+                cumulative += count
+                yield sample(name + '_bucket', prefix + 'le="{}"'.format(bound), cumulative)
+            yield sample(name + '_sum', labels, histogram.sum)
+            yield sample(name + '_count', labels, histogram.count)
+
+    def prometheus_text(self):
+        """
+        Method returning the metrics as one Prometheus text snapshot
+        """
+        return ''.join(line + '\n' for line in self.prometheus_lines())
+
+    def dump(self, filename):
+        """
+        Method to write a Prometheus text snapshot to a file. It is written under a temporary
+        name and renamed, so a reader polling the file never sees half a snapshot
+        """
+        temporary = filename + '.tmp'
+        with open(temporary, 'w') as file:
+            file.write(self.prometheus_text())
+        os.replace(temporary, filename)
+
+
+class NullMetrics:
+    """
+    Metrics sink that throws everything away
+    """
+    def increment(self, name, value=1, labels=None):
+        pass
+
+    def set_gauge(self, name, value, labels=None):
+        pass
+
+    def add_gauge(self, name, value, labels=None):
+        pass
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, labels=None):
+        pass
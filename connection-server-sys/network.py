@@ -7,8 +7,22 @@ E-mail: so01811@umbc.edu
 Description:
 The program creates a phone network using object-oriention. It allows for managing switchboards, connecting phones,
 handling calls, and saving/loading the network's state. Demonstrates classes and instance variables,
-recursion, and list structures.
+routing tables, and list and dictionary structures.
 """
+import contextlib
+import csv
+import itertools
+import json
+import mmap
+import struct
+import sys
+import time
+from array import array
+
+from metrics import (Metrics, NullMetrics, HOPS_BUCKETS, CALLS_ATTEMPTED, CALLS_CONNECTED, CALLS_FAILED,
+                     CALLS_ENDED, ACTIVE_CALLS, ROUTE_LOOKUPS, ROUTE_LOOKUP_SECONDS, ROUTE_HOPS, PHONES,
+                     SWITCHBOARDS, TRUNKS, NOT_CONNECTED, BUSY, BLOCKED)
+
 HYPHEN = "-"
 QUIT = 'quit'
 SWITCH_CONNECT = 'switch-connect'
@@ -19,6 +33,84 @@ NETWORK_LOAD = 'network-load'
 START_CALL = 'start-call'
 END_CALL = 'end-call'
 DISPLAY = 'display'
+TRUNK_STATS = 'trunk-stats'
+NETWORK_SNAPSHOT = 'network-snapshot'
+STATUS_EXPORT = 'status-export'
+METRICS = 'metrics'
+# display options: display [area code] [in-call] [page <n>]
+IN_CALL = 'in-call'
+PAGE = 'page'
+# records only written to the write-ahead log
+CALL = 'call'
+HANG_UP = 'hang-up'
+
+# binary snapshot: a fixed header followed by packed little-endian int64 arrays
+SNAPSHOT_MAGIC = b'NETSNAP\x00'
+SNAPSHOT_VERSION = 1
+# magic, version, flags, then the number of switchboards, trunks, phones, calls and call trunks
+SNAPSHOT_HEADER = struct.Struct('<8sIIQQQQQ')
+# flag set when the snapshot includes the calls in progress
+SNAPSHOT_CALLS = 1
+
+# characters of a command log read at a time when loading
+LOAD_CHUNK_SIZE = 1 << 20
+
+# lines shown on each page of display, and lines written at a time
+DISPLAY_PAGE_SIZE = 100
+DISPLAY_CHUNK_LINES = 4096
+
+# status export formats and the columns of each phone's row
+JSON = 'json'
+CSV = 'csv'
+STATUS_FIELDS = ('area_code', 'number', 'in_call', 'other_area_code', 'other_number')
+
+# metrics sink of switchboards and phones that are not in a network
+NULL_METRICS = NullMetrics()
+
+
+class ConsoleLog:
+    """
+    Operator message log printing each message to standard output as it is at the time, so
+    output captured with contextlib.redirect_stdout (as the server does) still gets them
+    """
+    def info(self, message, *args):
+        sys.stdout.write((message % args if args else message) + '\n')
+
+
+class NullLog:
+    """
+    Operator message log that drops everything
+    """
+    def info(self, message, *args):
+        pass
+
+
+# operator messages (calls connected, phones added, ...) go to this log. Anything with an
+# info(message, *args) method can replace it through set_log, a logging.Logger included
+logger = ConsoleLog()
+
+
+def set_log(log):
+    """
+    Function to send the operator messages to another log, returning the one it replaces
+    """
+    global logger
+    previous = logger
+    logger = log
+    return previous
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Context manager turning the operator messages off, so bulk work doesn't pay for them
+    """
+    previous = set_log(NullLog())
+    try:
+        yield
+    finally:
+        set_log(previous)
+
 
 class Phone:
     """
@@ -31,15 +123,20 @@ class Phone:
         self.switchboard = switchboard
         self.call = None
         self.otherPhone = None
+        # trunks holding a circuit for the current call, shared with the other phone
+        self.circuits = None
 
     def connect(self, area_code, other_phone_number):
         """
         Connects this phone to another phone using the specified area code
-        and phone number.
+        and phone number. A circuit is reserved on every trunk along the route,
+        the call is blocked if no route has a free circuit on every hop.
         """
+        metrics = self.switchboard.metrics
+        metrics.increment(CALLS_ATTEMPTED)
         # if this phone is already in a call, the current call is disconnected
         if self.call != None:
-            print("Disconnecting current call to make new call")
+            logger.info("Disconnecting current call to make new call")
             self.disconnect()
         # empty list to track the switchboards already checked recursively
         previous_codes = []
@@ -47,16 +144,39 @@ class Phone:
         output = self.switchboard.connect_call(area_code, other_phone_number, previous_codes)
         if output == None:
             # connection was not successful
-            print(str(self.number)+" and "+str(other_phone_number)+" were not connected.")
-        else:
-            # output will be the switchboard through which the call is made.
-            print(str(self.number)+" and "+str(other_phone_number)+" are now connected.")
-            self.call = output
-            self.otherPhone = output.findPhone(other_phone_number)
-            self.otherPhone.call = self.switchboard
-            self.otherPhone.otherPhone = self
+            metrics.increment(CALLS_FAILED, labels={'reason': NOT_CONNECTED})
+            logger.info("%s and %s were not connected.", self.number, other_phone_number)
+            return None
+        other_phone = output.findPhone(other_phone_number)
+        if other_phone is self or other_phone.call != None:
+            # the other phone is already in a call
+            metrics.increment(CALLS_FAILED, labels={'reason': BUSY})
+            logger.info("%s is busy, %s and %s were not connected.", other_phone_number, self.number,
+                        other_phone_number)
+            return None
+        # hold a circuit on each trunk of the route
+        circuits = self.switchboard.reserve_route(area_code)
+        if circuits == None:
+            metrics.increment(CALLS_FAILED, labels={'reason': BLOCKED})
+            logger.info("All trunk lines are busy, %s and %s were not connected.", self.number, other_phone_number)
+            return None
+        # output will be the switchboard through which the call is made.
+        metrics.increment(CALLS_CONNECTED)
+        metrics.add_gauge(ACTIVE_CALLS, 1)
+        metrics.observe(ROUTE_HOPS, len(circuits), HOPS_BUCKETS)
+        logger.info("%s and %s are now connected.", self.number, other_phone_number)
+        self.call = output
+        self.otherPhone = other_phone
+        self.otherPhone.call = self.switchboard
+        self.otherPhone.otherPhone = self
+        self.circuits = circuits
+        self.otherPhone.circuits = circuits
+        if self.switchboard.network is not None:
+            self.switchboard.network.journal_record(
+                CALL, self.switchboard.area_code, self.number, output.area_code, other_phone_number,
+                *(trunk.index for trunk in circuits))
 
-            return output
+        return output
 
     def searchList(self, list, number):
         """
@@ -65,21 +185,26 @@ class Phone:
         # iterate through list to find phone number
         for i in list:
             if i.number == number:
-                print(i.number)
+                logger.info("%s", i.number)
 
     def display(self, phonenumber):
         """
         Method to display data. Generates a string describing the current status of the phone.
         """
-        # Initialize an empty string
-        output = ""
         # phone is ideal if it's not called
         if self.call == None:
-            output = (" "*9+"Phone with number: " + str(self.number) + " is not in use.")
-        else:
-            # if phone is in call, display details of connection
-            output = (" "*9+"Phone with number: " + str(self.number) + " is connected to " + str(self.call.area_code) + "-" + str(self.otherPhone.otherPhone.number))
-        return output
+            return "         Phone with number: {} is not in use.".format(self.number)
+        # if phone is in call, display details of connection
+        return "         Phone with number: {} is connected to {}-{}".format(
+            self.number, self.call.area_code, self.otherPhone.number)
+
+    def status(self):
+        """
+        Method returning the phone's row of a status export
+        """
+        if self.call == None:
+            return (self.switchboard.area_code, self.number, False, None, None)
+        return (self.switchboard.area_code, self.number, True, self.call.area_code, self.otherPhone.number)
 
     def disconnect(self):
         """
@@ -87,17 +212,96 @@ class Phone:
         """
         if self.call == None:
             # phone is not currently in a call
-            print(str(self.switchboard.area_code) + "-" + str(self.number) + " is not in a call")
+            logger.info("%s-%s is not in a call", self.switchboard.area_code, self.number)
         else:
             # phone is in a call, disconnect connection
-            print("Hanging up...")
-            print("Connection Terminated.")
-            print("Disconnected (" + str(self.switchboard.area_code) + "-" + str(self.number) + ") and (" + str(self.call.area_code) + "-" + str(self.otherPhone.number) + ")")
-            # Reset the call
-            self.otherPhone.call = None
-            self.otherPhone.otherPhone = None
-            self.call = None
-            self.otherPhone = None
+            logger.info("Hanging up...\nConnection Terminated.\nDisconnected (%s-%s) and (%s-%s)",
+                        self.switchboard.area_code, self.number, self.call.area_code, self.otherPhone.number)
+            self.hang_up()
+
+    def hang_up(self):
+        """
+        Method to end the current call without printing anything
+        """
+        # give the circuits back to the trunks
+        for trunk in self.circuits:
+            trunk.release()
+        # Reset the call
+        self.otherPhone.call = None
+        self.otherPhone.otherPhone = None
+        self.otherPhone.circuits = None
+        self.call = None
+        self.otherPhone = None
+        self.circuits = None
+        metrics = self.switchboard.metrics
+        metrics.increment(CALLS_ENDED)
+        metrics.add_gauge(ACTIVE_CALLS, -1)
+        if self.switchboard.network is not None:
+            self.switchboard.network.journal_record(HANG_UP, self.switchboard.area_code, self.number)
+
+
+class Trunk:
+    """
+    This class represents the trunk line between two switchboards. A trunk carries a fixed
+    number of circuits (None for unlimited), one per call crossing it, and counts how it is used
+    """
+    def __init__(self, switchboard_1, switchboard_2, circuits=None):
+        self.ends = (switchboard_1, switchboard_2)
+        self.circuits = circuits
+        # position in the network's list of trunks
+        self.index = None
+        self.in_use = 0
+        # counters: calls that tried this trunk, found it full, and were carried over it
+        self.attempts = 0
+        self.blocked = 0
+        self.carried = 0
+        self.peak = 0
+
+    def is_free(self):
+        """
+        Method to check whether the trunk has a circuit left
+        """
+        return self.circuits is None or self.in_use < self.circuits
+
+    def reserve(self):
+        """
+        Method to take a circuit for a call
+        """
+        self.in_use += 1
+        self.carried += 1
+        if self.in_use > self.peak:
+            self.peak = self.in_use
+
+    def release(self):
+        """
+        Method to give a circuit back when a call ends
+        """
+        self.in_use -= 1
+
+    def utilization(self):
+        """
+        Method returning the fraction of circuits in use, 0 for an unlimited trunk
+        """
+        if not self.circuits:
+            return 0.0
+        return self.in_use / self.circuits
+
+    def blocking_probability(self):
+        """
+        Method returning the fraction of calls that found the trunk full
+        """
+        if self.attempts == 0:
+            return 0.0
+        return self.blocked / self.attempts
+
+    def stats(self):
+        """
+        Method returning the trunk's counters in a dictionary
+        """
+        return {'ends': (self.ends[0].area_code, self.ends[1].area_code), 'circuits': self.circuits,
+                'in_use': self.in_use, 'peak': self.peak, 'utilization': self.utilization(),
+                'attempts': self.attempts, 'blocked': self.blocked, 'carried': self.carried,
+                'blocking_probability': self.blocking_probability()}
 
 
 class Switchboard:
@@ -109,21 +313,29 @@ class Switchboard:
         self.area_code = area_code
         self.trunklines = [] # List to store connections
         self.phones = [] # list to store phones
+        # indexes over the lists above so lookups don't walk them
+        self.trunk_index = {} # area code -> connected switchboard
+        self.phone_index = {} # phone number -> phone
+        # routing table: area code -> (next switchboard on a shortest route, number of hops)
+        self.routes = {area_code: (self, 0)}
+        self.trunks = {} # area code -> Trunk to that switchboard
+        # network this switchboard belongs to, set when it is added
+        self.network = None
 
+    @property
+    def metrics(self):
+        """
+        Metrics sink of the network, one that drops everything if there is no network
+        """
+        return NULL_METRICS if self.network is None else self.network.metrics
 
     def checkPhone(self, phone_number):
         """
         Method to check whether the phone is represented by number
         in the switchboard list
         """
-        # initialize output
-        output = False
-        # iterate through registered phones with switchboard
-        for i in self.phones:
-            if i.number == phone_number:
-                # if a phone with a given number is found, set output to True
-                output = True
-        return output
+        # look the number up in the index of registered phones
+        return phone_number in self.phone_index
 
     def checkTrunkline(self, switchboard):
         """
@@ -131,14 +343,8 @@ class Switchboard:
         Returns True if the switchboard is already connected via a trunkline
 
         """
-        #initialize output to false
-        output = False
-        # iterates through each trunkline connection
-        for i in self.trunklines:
-
-            if i == switchboard:
-                output = True
-        return output
+        # look the area code up in the index of trunkline connections
+        return self.trunk_index.get(switchboard.area_code) is switchboard
 
     def add_phone(self, phone_number):
         """
@@ -146,273 +352,808 @@ class Switchboard:
         """
         # if phone does not exist
         if not self.checkPhone(phone_number):
-            self.phones.append(Phone(phone_number, self)) # add phone number
+            phone = Phone(phone_number, self)
+            self.phones.append(phone) # add phone number
+            self.phone_index[phone_number] = phone
+            self.metrics.add_gauge(PHONES, 1)
+            if self.network is not None:
+                self.network.journal_record(PHONE_ADD, self.area_code, phone_number)
         else:
             # if phone number already exist
-            print("Phone number already exists")
+            logger.info("Phone number already exists")
+
+    def add_phones(self, numbers):
+        """
+        Method to add many phones at once, numbers already registered are skipped.
+        Returns how many phones were added
+        """
+        index = self.phone_index
+        # dict.fromkeys drops repeated numbers but keeps their order
+        new_phones = [Phone(number, self) for number in dict.fromkeys(numbers) if number not in index]
+        self.phones.extend(new_phones)
+        index.update((phone.number, phone) for phone in new_phones)
+        self.metrics.add_gauge(PHONES, len(new_phones))
+        if self.network is not None and self.network.journal is not None:
+            for phone in new_phones:
+                self.network.journal_record(PHONE_ADD, self.area_code, phone.number)
+        return len(new_phones)
 
-    def add_trunk_connection(self, switchboard):
+    def add_trunk_connection(self, switchboard, trunk=None):
         """
         Method to add switchboard to current trunkline , checks if truckline
-        already exist. Otherwise, adds connection
+        already exist. Otherwise, adds connection. trunk is the Trunk shared with
+        the other switchboard, an unlimited one is made if not given
         """
         # if connection does not already exist
         if not self.checkTrunkline(switchboard):
             self.trunklines.append(switchboard) # add connection
+            self.trunk_index[switchboard.area_code] = switchboard
+            if trunk is None:
+                trunk = Trunk(self, switchboard)
+            self.trunks[switchboard.area_code] = trunk
         else:
             # connection already exist
-            print("Trunk line already exists in current switchboard.")
+            logger.info("Trunk line already exists in current switchboard.")
 
     def findNumber(self, number):
         """
         Method to check whether the phone number is present in the list
         """
-        # intialize output to false
-        output = False
-        # iterate through each phone registered with this switchboard.
-        for i in self.phones:
-            # if phone number is found
-            if i.number == number:
-                output = True
-        return output
+        # look the number up in the index of registered phones
+        return number in self.phone_index
 
     def findPhone(self, number):
         """
         Method to return the phone object if it is in the phone list
         """
-        # initialize output to None
-        output = None
-        # iterate through each phone in the switchboard's list of phones
-        for i in self.phones:
-            # if phone with matching number is found
-            if i.number == number:
-                output = i
-        return output
+        # phone with matching number, or None
+        return self.phone_index.get(number)
 
-    def connect_call(self, area_code, number, previous_codes):
+    def route(self, area_code):
         """
-        method to check whether two phones have connection and, if yes, connect them
-        if not, it recursively searches connected switchboards,
+        Method to find the switchboards on a shortest route to an area code by following
+        the routing table. Returns the list of switchboards from this one to the destination,
+        or None if the area code can't be reached
         """
-        # add current switchboard's area code to the list of checked area codes
-        previous_codes.append(self.area_code)
-        # find phone on switchboard if match is found
-        if self.area_code == area_code:
-            if self.findPhone(number).number == number:
-                return self # return switchboard if phone is found
-            else:
+        if area_code not in self.routes:
+            return None
+        path = [self]
+        switchboard = self
+        while switchboard.area_code != area_code:
+            # each switchboard knows the next hop towards every reachable area code
+            switchboard = switchboard.routes[area_code][0]
+            path.append(switchboard)
+        return path
+
+    def free_route(self, area_code):
+        """
+        Method to find a route with the fewest hops using only trunks with a free circuit,
+        searched breadth first. Returns the list of switchboards or None
+        """
+        previous = {self.area_code: None}
+        queue = [self]
+        for switchboard in queue:
+            if switchboard.area_code == area_code:
+                # walk back to build the route
+                path = []
+                while switchboard is not None:
+                    path.append(switchboard)
+                    switchboard = previous[switchboard.area_code]
+                path.reverse()
+                return path
+            for code, trunk in switchboard.trunks.items():
+                if code not in previous and trunk.is_free():
+                    previous[code] = switchboard
+                    queue.append(switchboard.trunk_index[code])
+        return None
+
+    def reserve_route(self, area_code):
+        """
+        Method to take a circuit on every trunk from this switchboard to an area code.
+        The shortest route is tried first, if one of its trunks is full the call overflows
+        to the shortest route with free circuits. Returns the list of trunks holding a circuit,
+        or None if the call is blocked
+        """
+        path = self.route(area_code)
+        if path is None:
+            return None
+        trunks = [path[i].trunks[path[i + 1].area_code] for i in range(len(path) - 1)]
+        full = False
+        for trunk in trunks:
+            trunk.attempts += 1
+            if not trunk.is_free():
+                trunk.blocked += 1
+                full = True
+        if full:
+            # look for another way round the full trunks
+            path = self.free_route(area_code)
+            if path is None:
+                if self.network is not None:
+                    self.network.calls_blocked += 1
                 return None
-        else:
-            # iterate through trucklines
-            for i in self.trunklines:
-                if not i in previous_codes:
-                    # recursively calls connect_call on connected switchboards
-                    return i.connect_call(area_code, number, previous_codes)
-                else:
-                    return None
+            # a trunk on both routes was already counted, it is one attempt of this call
+            tried = set(trunks)
+            trunks = [path[i].trunks[path[i + 1].area_code] for i in range(len(path) - 1)]
+            for trunk in trunks:
+                if trunk not in tried:
+                    trunk.attempts += 1
+        for trunk in trunks:
+            trunk.reserve()
+        return trunks
+
+    def connect_call(self, area_code, number, previous_codes=None):
+        """
+        method to check whether two phones have connection and, if yes, connect them.
+        The routing table gives the route with the fewest hops, the area codes along it
+        are added to previous_codes
+        """
+        start = time.perf_counter()
+        path = self.route(area_code)
+        if path is not None:
+            if previous_codes is not None:
+                # record the switchboards the call goes through
+                previous_codes.extend(switchboard.area_code for switchboard in path)
+            # return the destination switchboard if the phone is found there
+            destination = path[-1]
+            if destination.findPhone(number) is None:
+                path = None
+        metrics = self.metrics
+        metrics.increment(ROUTE_LOOKUPS)
+        metrics.observe(ROUTE_LOOKUP_SECONDS, time.perf_counter() - start)
+        return None if path is None else destination
 
 
 class Network:
     """
     This class represents the Network system. It manages the collection of switchboards,
     """
-    def __init__(self):
+    def __init__(self, metrics=None):
         self.switchboards = []
-        self.temp = []
+        # index over switchboards so lookups by area code don't walk the list
+        self.switchboard_index = {} # area code -> switchboard
+        self.trunks = [] # every trunk line, once
+        # calls turned away because every route had a full trunk
+        self.calls_blocked = 0
+        # write-ahead log every change is recorded in, if any (see journal.py)
+        self.journal = None
+        # counters and timers of call handling, kept in memory unless another sink is given
+        self.metrics = Metrics() if metrics is None else metrics
+        for gauge in (SWITCHBOARDS, TRUNKS, PHONES, ACTIVE_CALLS):
+            self.metrics.set_gauge(gauge, 0)
+
+    def journal_record(self, *fields):
+        """
+        Method to append a change to the write-ahead log, if the network has one
+        """
+        if self.journal is not None:
+            self.journal.record(fields)
 
     def searchSwitchboards(self, area_code):
         """
         Method to find a switchboard object by its area code
         """
-        # initialize output to None
-        output = None
-        # iterates through switchboard list
-        for i in self.switchboards:
-            # if switchboard with matching area code is found:
-            if i.area_code == area_code:
-                output = i
-        return output
+        # switchboard with matching area code, or None
+        return self.switchboard_index.get(area_code)
 
     def presentSwitchboards(self, area_code):
         """
         Method to check whether a switchboard exists
         """
-        # initialize boolean flag
-        flag = False
-        # iterate through switchboard list in network
-        for i in self.switchboards:
-            # if switchboard with matching area code exists, set flag to True,
-            # indicating switchboard is present
-            if i.area_code == area_code:
-                flag = True
-        return flag
+        # switchboard is present if its area code is in the index
+        return area_code in self.switchboard_index
 
-    def load_network(self, filename):
+    def load_network(self, filename, progress=None, chunk_size=LOAD_CHUNK_SIZE):
+        """
+        Method to load the existing network from a command log. The file is read a chunk at
+        a time and each command applied in order, phone-add commands are collected and added
+        to their switchboard in bulk, so memory stays the same however long the log is.
+        :param progress: optional function called with (lines read, seconds so far) after each chunk
+        :return: dictionary with the number of lines, seconds and lines per second
         """
-        Method to load the existing network, reading the input line by line
-        from a specific file, processes each command and updates networks state.
+        lines = 0
+        start = time.perf_counter()
+        # phone numbers waiting to be added, per switchboard
+        pending = {}
+        with open(filename, 'r') as file:
+            tail = ''
+            while True:
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    break
+                # the last piece may be half a line, keep it for the next chunk
+                chunk_lines = (tail + chunk).split('\n')
+                tail = chunk_lines.pop()
+                self._apply_commands(chunk_lines, pending)
+                lines += len(chunk_lines)
+                self._add_pending_phones(pending)
+                if progress is not None:
+                    progress(lines, time.perf_counter() - start)
+            if tail:
+                self._apply_commands([tail], pending)
+                lines += 1
+                self._add_pending_phones(pending)
+        seconds = time.perf_counter() - start
+        return {'lines': lines, 'seconds': seconds,
+                'lines_per_second': lines / seconds if seconds > 0 else 0.0}
 
+    def _apply_commands(self, command_lines, pending):
         """
-        file = open(filename, 'r')
-        for command in file.readlines():
+        Method to apply a batch of command log lines, phone numbers are added to pending
+        """
+        for command in command_lines:
             # process each line in file
             split_command = command.split()
-            # store command parts into temp list
-            self.temp.append(split_command)
-            # execute SWITCH_CONNECT command
-            if len(split_command) == 3 and split_command[0].lower() == SWITCH_CONNECT:
+            if not split_command:
+                continue
+            name = split_command[0].lower()
+            # executes PHONE_ADD command, the most common one, first
+            if name == PHONE_ADD and len(split_command) == 3:
+                # parse area code and phone number from the command
+                switchBoard = self.switchboard_index.get(int(split_command[1]))
+                # keep the phone for the switchboard's bulk insert
+                if switchBoard != None:
+                    pending.setdefault(switchBoard, []).append(int(split_command[2]))
+            # execute SWITCH_CONNECT command, with an optional number of circuits
+            elif name == SWITCH_CONNECT and len(split_command) in (3, 4):
                 # parse area codes and connect corresponding switchboards
                 area_1 = int(split_command[1])
                 area_2 = int(split_command[2])
-                the_network.connect_switchboards(area_1, area_2)
-
+                circuits = int(split_command[3]) if len(split_command) == 4 else None
+                self.connect_switchboards(area_1, area_2, circuits)
             # execute SWITCH_ADD
-            elif len(split_command) == 2 and split_command[0].lower() == SWITCH_ADD:
+            elif name == SWITCH_ADD and len(split_command) == 2:
                 # parse area codes and add new switchboard with corresponding area codes
-                the_network.add_switchboard(int(split_command[1]))
-            # executes PHONE_ADD command
-            elif len(split_command) == 3 and split_command[0].lower() == PHONE_ADD:
-                # parse area code and phone number from the command
-                area_code = int(split_command[1])
-                phone_number = int(split_command[2])
-                # find switchboard with specific area code and add phone to switchboard
-                switchBoard = the_network.searchSwitchboards(area_code)
-                if switchBoard != None:
-                    if not switchBoard.checkPhone(phone_number):
-                        switchBoard.add_phone(phone_number)
+                self.add_switchboard(int(split_command[1]))
+
+    def _add_pending_phones(self, pending):
+        """
+        Method to add the collected phone numbers to their switchboards and empty pending
+        """
+        for switchboard, numbers in pending.items():
+            switchboard.add_phones(numbers)
+        pending.clear()
 
     def save_network(self, filename, list):
         """
-        Method to save a network
+        Method to save a network, replacing whatever the file held
         """
-        file = open(filename, 'a+')
+        file = open(filename, 'w')
         for i in list:
             file.write(i + "\n")
         file.close()
 
+    def save_snapshot(self, filename, include_calls=False):
+        """
+        Method to save the network as a compact binary snapshot: switchboard area codes,
+        trunks and phone numbers as packed arrays, plus the calls in progress if include_calls
+        """
+        position = {switchboard.area_code: i for i, switchboard in enumerate(self.switchboards)}
+        area_codes = array('q', (switchboard.area_code for switchboard in self.switchboards))
+        phone_counts = array('q', (len(switchboard.phones) for switchboard in self.switchboards))
+        numbers = array('q')
+        for switchboard in self.switchboards:
+            numbers.extend(phone.number for phone in switchboard.phones)
+        # each trunk is (first switchboard, second switchboard, circuits or -1 for unlimited)
+        trunks = array('q')
+        for trunk in self.trunks:
+            trunks.extend((position[trunk.ends[0].area_code], position[trunk.ends[1].area_code],
+                           -1 if trunk.circuits is None else trunk.circuits))
+        # each call is (switchboard, number, other switchboard, other number, trunks it holds),
+        # the trunks themselves are listed in call_trunks
+        calls = array('q')
+        call_trunks = array('q')
+        if include_calls:
+            saved = set()
+            for switchboard in self.switchboards:
+                for phone in switchboard.phones:
+                    other = phone.otherPhone
+                    if other is None or id(phone) in saved:
+                        continue
+                    saved.add(id(other))
+                    circuits = phone.circuits or []
+                    calls.extend((position[switchboard.area_code], phone.number,
+                                  position[other.switchboard.area_code], other.number, len(circuits)))
+                    call_trunks.extend(trunk.index for trunk in circuits)
+
+        with open(filename, 'wb') as file:
+            file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                                            SNAPSHOT_CALLS if include_calls else 0,
+                                            len(area_codes), len(self.trunks), len(numbers),
+                                            len(calls) // 5, len(call_trunks)))
+            for section in (area_codes, phone_counts, trunks, numbers, calls, call_trunks):
+                file.write(section.tobytes())
+
+    @staticmethod
+    def is_snapshot(filename):
+        """
+        Method to check whether a file is a binary snapshot rather than a command log
+        """
+        with open(filename, 'rb') as file:
+            return file.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+
+    def load_snapshot(self, filename):
+        """
+        Method to load a binary snapshot into this (empty) network. The file is memory-mapped
+        and each section read straight out of it in one pass
+        """
+        if self.switchboards:
+            raise ValueError("Snapshots can only be loaded into an empty network")
+        with open(filename, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if len(data) < SNAPSHOT_HEADER.size:
+                    raise ValueError(filename + " is not a network snapshot")
+                (magic, version, flags, switchboard_count, trunk_count, phone_count,
+                 call_count, call_trunk_count) = SNAPSHOT_HEADER.unpack_from(data)
+                if magic != SNAPSHOT_MAGIC:
+                    raise ValueError(filename + " is not a network snapshot")
+                if version != SNAPSHOT_VERSION:
+                    raise ValueError("Unsupported snapshot version " + str(version))
+                # view the rest of the file as int64 values without copying it, a torn last
+                # value is left out and reported as a short section below
+                end = SNAPSHOT_HEADER.size + (len(data) - SNAPSHOT_HEADER.size) // 8 * 8
+                words = memoryview(data)[SNAPSHOT_HEADER.size:end].cast('q')
+                try:
+                    sections = []
+                    start = 0
+                    for name, length in (('area codes', switchboard_count), ('phone counts', switchboard_count),
+                                         ('trunks', 3 * trunk_count), ('phones', phone_count),
+                                         ('calls', 5 * call_count), ('call trunks', call_trunk_count)):
+                        section = words[start:start + length].tolist()
+                        if len(section) != length:
+                            raise ValueError(filename + " is truncated: " + name + " section has " +
+                                             str(len(section)) + " of " + str(length) + " values")
+                        sections.append(section)
+                        start += length
+                finally:
+                    words.release()
+        area_codes, phone_counts, trunks, numbers, calls, call_trunks = sections
+
+        # switchboards and their phones
+        start = 0
+        for area_code, count in zip(area_codes, phone_counts):
+            switchboard = Switchboard(area_code)
+            switchboard.network = self
+            self.switchboards.append(switchboard)
+            self.switchboard_index[area_code] = switchboard
+            switchboard.add_phones(numbers[start:start + count])
+            start += count
+
+        # trunks, then the routing tables all at once
+        for i in range(0, len(trunks), 3):
+            switchboard_1 = self.switchboards[trunks[i]]
+            switchboard_2 = self.switchboards[trunks[i + 1]]
+            trunk = Trunk(switchboard_1, switchboard_2, None if trunks[i + 2] < 0 else trunks[i + 2])
+            trunk.index = len(self.trunks)
+            self.trunks.append(trunk)
+            switchboard_1.add_trunk_connection(switchboard_2, trunk)
+            switchboard_2.add_trunk_connection(switchboard_1, trunk)
+        self.rebuild_routes()
+        self.metrics.set_gauge(SWITCHBOARDS, len(self.switchboards))
+        self.metrics.set_gauge(TRUNKS, len(self.trunks))
+
+        # calls in progress, holding their circuits again
+        start = 0
+        for i in range(0, len(calls), 5):
+            phone = self.switchboards[calls[i]].findPhone(calls[i + 1])
+            other = self.switchboards[calls[i + 2]].findPhone(calls[i + 3])
+            self.restore_call(phone, other, call_trunks[start:start + calls[i + 4]])
+            start += calls[i + 4]
+
+    def restore_call(self, phone, other, trunk_indexes):
+        """
+        Method to put back a call between two phones over the given trunks (by position in
+        the trunk list), without routing it again. Used when loading saved state
+        """
+        circuits = [self.trunks[j] for j in trunk_indexes]
+        for trunk in circuits:
+            trunk.in_use += 1
+            trunk.peak = max(trunk.peak, trunk.in_use)
+        self.metrics.add_gauge(ACTIVE_CALLS, 1)
+        phone.call = other.switchboard
+        phone.otherPhone = other
+        phone.circuits = circuits
+        other.call = phone.switchboard
+        other.otherPhone = phone
+        other.circuits = circuits
+
     def add_switchboard(self, area_code):
         """
         Method to add a switchboard to network list if it does not exist
         """
         # if switchboard already exist in system.
         if not self.presentSwitchboards(area_code):
-            self.switchboards.append(Switchboard(area_code))
+            switchboard = Switchboard(area_code)
+            switchboard.network = self
+            self.switchboards.append(switchboard)
+            self.switchboard_index[area_code] = switchboard
+            self.metrics.add_gauge(SWITCHBOARDS, 1)
+            self.journal_record(SWITCH_ADD, area_code)
         else:
-            print("Area code already exists.")
+            logger.info("Area code already exists.")
 
-    def connect_switchboards(self, area_1, area_2):
+    def connect_switchboards(self, area_1, area_2, circuits=None):
         """
         Method to connects 2 switchboards together with area codes by adding each
-        as a truckline to the other
+        as a truckline to the other. circuits is how many calls the trunk can carry
+        at once, None for no limit
         """
         # if either of switchboards does not exist.
         if self.presentSwitchboards(area_1) == False or self.presentSwitchboards(area_2) == False:
-            print("One or more of the switchboards do not exist")
+            logger.info("One or more of the switchboards do not exist")
         else:
             # connect switchboards to each other
-            self.searchSwitchboards(area_1).add_trunk_connection(self.searchSwitchboards(area_2))
-            self.searchSwitchboards(area_2).add_trunk_connection(self.searchSwitchboards(area_1))
+            switchboard_1 = self.searchSwitchboards(area_1)
+            switchboard_2 = self.searchSwitchboards(area_2)
+            if switchboard_1.checkTrunkline(switchboard_2):
+                logger.info("Trunk line already exists in current switchboard.")
+                return
+            # one trunk shared by both ends so its circuits are counted once
+            trunk = Trunk(switchboard_1, switchboard_2, circuits)
+            trunk.index = len(self.trunks)
+            self.trunks.append(trunk)
+            switchboard_1.add_trunk_connection(switchboard_2, trunk)
+            switchboard_2.add_trunk_connection(switchboard_1, trunk)
+            self.update_routes(switchboard_1, switchboard_2)
+            self.metrics.add_gauge(TRUNKS, 1)
+            if circuits is None:
+                self.journal_record(SWITCH_CONNECT, area_1, area_2)
+            else:
+                self.journal_record(SWITCH_CONNECT, area_1, area_2, circuits)
 
-    def display(self):
+    def trunk_stats(self):
         """
-        Method to display current state of entire network
+        Method returning the utilization and blocking counters of every trunk
         """
-        for i in self.switchboards:
-            # print the area code of the switchboard
-            print("Switchboard with area code: " + str(i.area_code))
-            # print each trunk line connected to the switchboard
-            print(" "*5+"Trunk lines are: ")
-            for j in i.trunklines:
-                print(" "*9+"Trunkline connection to: " + str(j.area_code))
-            print(" "*5+"Local phone numbers are:")
-            # Print each phone number registered with the switchboard
-            for j in i.phones:
-                print(j.display(j.number))
+        return [trunk.stats() for trunk in self.trunks]
 
+    def rebuild_routes(self):
+        """
+        Method to recompute every routing table from scratch with a breadth first search from
+        each switchboard, used after trunks are loaded in bulk
+        """
+        for source in self.switchboards:
+            routes = {source.area_code: (source, 0)}
+            queue = [source]
+            for switchboard in queue:
+                first_hop, hops = routes[switchboard.area_code]
+                for neighbour in switchboard.trunklines:
+                    if neighbour.area_code not in routes:
+                        # the first hop is the neighbour itself when leaving the source
+                        routes[neighbour.area_code] = (neighbour if switchboard is source else first_hop, hops + 1)
+                        queue.append(neighbour)
+            source.routes = routes
+
+    def update_routes(self, switchboard_1, switchboard_2):
+        """
+        Method to update every routing table after a trunk line is added between two
+        switchboards. A shortest route can only get shorter by crossing the new trunk once,
+        so only pairs on either side of it are checked, nothing is searched from scratch
+        """
+        # work out every change from the tables as they were before the new trunk
+        changes = []
+        for near, far in ((switchboard_1, switchboard_2), (switchboard_2, switchboard_1)):
+            for source_code, (_, to_near) in near.routes.items():
+                source = self.switchboard_index[source_code]
+                # the route from source starts the same way as its route to near
+                next_hop = far if source is near else source.routes[near.area_code][0]
+                for destination_code, (_, from_far) in far.routes.items():
+                    hops = to_near + 1 + from_far
+                    current = source.routes.get(destination_code)
+                    if current is None or hops < current[1]:
+                        changes.append((source, destination_code, next_hop, hops))
+        # apply the shortest of the changes found for each pair
+        for source, destination_code, next_hop, hops in changes:
+            current = source.routes.get(destination_code)
+            if current is None or hops < current[1]:
+                source.routes[destination_code] = (next_hop, hops)
+
+    def selected_switchboards(self, area_code=None):
+        """
+        Method returning every switchboard, or only the one with area_code if given
+        """
+        if area_code is None:
+            return self.switchboards
+        switchboard = self.searchSwitchboards(area_code)
+        return [] if switchboard is None else [switchboard]
+
+    def display_lines(self, area_code=None, in_call=False):
+        """
+        Method generating the lines of display one at a time, for one area code only if given
+        and only phones in a call if in_call
+        """
+        for switchboard in self.selected_switchboards(area_code):
+            phones = switchboard.phones
+            if in_call:
+                phones = [phone for phone in phones if phone.call is not None]
+            yield from switchboard_lines(switchboard, (phone.display(phone.number) for phone in phones))
+
+    def display(self, area_code=None, in_call=False, page=None, page_size=DISPLAY_PAGE_SIZE):
+        """
+        Method to display current state of entire network, or one page of it if page is given.
+        Lines are written in large blocks instead of one print each
+        """
+        write_lines(self.display_lines(area_code, in_call), page, page_size)
+
+    def status_rows(self, area_code=None, in_call=False):
+        """
+        Method generating the status export row of every phone, see STATUS_FIELDS
+        """
+        for switchboard in self.selected_switchboards(area_code):
+            for phone in switchboard.phones:
+                if not in_call or phone.call is not None:
+                    yield phone.status()
+
+    def status_summary(self):
+        """
+        Method returning counts describing the whole network
+        """
+        phones = sum(len(switchboard.phones) for switchboard in self.switchboards)
+        in_call = sum(1 for switchboard in self.switchboards for phone in switchboard.phones
+                      if phone.call is not None)
+        return {'switchboards': len(self.switchboards), 'trunks': len(self.trunks), 'phones': phones,
+                'calls': in_call // 2, 'calls_blocked': self.calls_blocked}
+
+    def export_status(self, file, format=JSON, area_code=None, in_call=False):
+        """
+        Method to write the state of the phones to an open text file as it is read, without
+        building the whole export in memory. JSON is one object per line, a summary first,
+        CSV is a header row then one row per phone
+        """
+        write_status(file, format, self.status_summary(), self.status_rows(area_code, in_call))
+
+
+def switchboard_lines(switchboard, phone_lines):
+    """
+    Function generating the display lines of one switchboard, given its phones' lines
+    """
+    # print the area code of the switchboard
+    yield "Switchboard with area code: " + str(switchboard.area_code)
+    # print each trunk line connected to the switchboard
+    yield "     Trunk lines are: "
+    for other in switchboard.trunklines:
+        yield "         Trunkline connection to: " + str(other.area_code)
+    yield "     Local phone numbers are:"
+    # Print each phone number registered with the switchboard
+    yield from phone_lines
+
+
+def write_lines(lines, page=None, page_size=DISPLAY_PAGE_SIZE):
+    """
+    Function to write lines to standard output a block at a time. If page is given only that
+    page (counting from 1) is written, followed by a note if more pages come after it
+    """
+    if page is not None:
+        # one extra line tells whether there is another page
+        lines = list(itertools.islice(lines, (page - 1) * page_size, page * page_size + 1))
+        more = len(lines) > page_size
+        lines = lines[:page_size]
+    lines = iter(lines)
+    out = sys.stdout
+    while True:
+        block = list(itertools.islice(lines, DISPLAY_CHUNK_LINES)) if page is None else lines
+        if block:
+            out.write('\n'.join(block) + '\n')
+        if page is not None or len(block) < DISPLAY_CHUNK_LINES:
+            break
+    if page is not None:
+        if more:
+            out.write("-- page {}, more on page {} --\n".format(page, page + 1))
+        else:
+            out.write("-- page {}, end --\n".format(page))
+
+
+def write_status(file, format, summary, rows):
+    """
+    Function to write a status export from a summary dictionary and phone rows, see
+    Network.export_status
+    """
+    if format == JSON:
+        file.write(json.dumps(dict(summary, type='summary')) + '\n')
+        # rows only hold integers, booleans and None, so they are formatted directly rather
+        # than through json.dumps, and written a block at a time
+        template = '{{' + ', '.join('"' + field + '": {}' for field in STATUS_FIELDS) + ', "type": "phone"}}\n'
+        literals = {None: 'null', True: 'true', False: 'false'}
+        rows = iter(rows)
+        while True:
+            block = [template.format(*(literals[value] if value is None or value is True or value is False
+                                       else value for value in row))
+                     for row in itertools.islice(rows, DISPLAY_CHUNK_LINES)]
+            if not block:
+                break
+            file.write(''.join(block))
+    elif format == CSV:
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(STATUS_FIELDS)
+        writer.writerows(('' if value is None else value for value in row) for row in rows)
+    else:
+        raise ValueError("Unknown status format: " + str(format))
+
+
+def parse_display_options(split_command):
+    """
+    Function to read the options of a display command: an area code, in-call, and page <n>.
+    Returns (area code or None, in_call, page or None)
+    """
+    area_code = None
+    in_call = False
+    page = None
+    options = iter(split_command[1:])
+    for option in options:
+        if option.lower() == IN_CALL:
+            in_call = True
+        elif option.lower() == PAGE:
+            page = max(1, int(next(options, '1')))
+        else:
+            area_code = int(option)
+    return area_code, in_call, page
+
+
+def export_status_command(network, split_command):
+    """
+    Function to run status-export <file or -> [json|csv] [area code] [in-call] on anything
+    with an export_status method
+    """
+    format = JSON
+    options = split_command[2:]
+    if options and options[0].lower() in (JSON, CSV):
+        format = options.pop(0).lower()
+    area_code, in_call, _ = parse_display_options([STATUS_EXPORT] + options)
+    if split_command[1] == HYPHEN:
+        # "-" streams the export to standard output
+        network.export_status(sys.stdout, format, area_code, in_call)
+    else:
+        with open(split_command[1], 'w', newline='') as file:
+            network.export_status(file, format, area_code, in_call)
+        logger.info('Status exported to %s.', split_command[1])
+
+
+def run_command(network, s, commands):
+    """
+    Function to apply one operator command to the network, printing the result.
+    Commands that are saved by network-save are appended to commands.
+    Returns the network to use from now on, a new one after network-load
+    """
+    split_command = s.split()
+    if len(split_command) in (3, 4) and split_command[0].lower() == SWITCH_CONNECT:
+        area_1 = int(split_command[1])
+        area_2 = int(split_command[2])
+        # optional number of circuits on the trunk
+        circuits = int(split_command[3]) if len(split_command) == 4 else None
+        network.connect_switchboards(area_1, area_2, circuits)
+        # append the command to the commands list
+        command = str(SWITCH_CONNECT + " " + str(area_1) + " " +  str(area_2))
+        if circuits is not None:
+            command += " " + str(circuits)
+        commands.append(command)
+
+    elif len(split_command) == 2 and split_command[0].lower() == SWITCH_ADD:
+        network.add_switchboard(int(split_command[1]))
+
+        commands.append(str(SWITCH_ADD + " " + str(split_command[1])))
+
+    elif len(split_command) == 2 and split_command[0].lower() == PHONE_ADD:
+        number_parts = split_command[1].split(HYPHEN)
+        area_code = int(number_parts[0])
+        phone_number = int(''.join(number_parts[1:]))
+        # append the command to the commands list
+        commands.append(str(PHONE_ADD + " " + str(area_code) + " " + str(phone_number)))
+
+        switchBoard = network.searchSwitchboards(area_code)
+        # add the phone to the specified switchboard
+        if switchBoard == None:
+            logger.info("Invalid area_code, create a new switchboard or enter a valid area code.")
+        else:
+            # phone number exists
+            if switchBoard.checkPhone(phone_number):
+                logger.info("Phone number already exists in area code")
+            else:
+                switchBoard.add_phone(phone_number)
+    elif len(split_command) == 2 and split_command[0].lower() == NETWORK_SAVE:
+        network.save_network(split_command[1], commands)
+        logger.info('Network saved to %s.', split_command[1])
+    elif len(split_command) == 2 and split_command[0].lower() == NETWORK_LOAD:
+        journal = network.journal
+        # the new network reports to the same metrics sink
+        network = Network(network.metrics)
+        # binary snapshots are recognised by their header, anything else is a command log
+        if Network.is_snapshot(split_command[1]):
+            network.load_snapshot(split_command[1])
+        else:
+            stats = network.load_network(split_command[1])
+            logger.info('Read %d lines in %.2fs (%.0f lines/s).',
+                        stats['lines'], stats['seconds'], stats['lines_per_second'])
+        if journal is not None:
+            # the loaded network replaces the journaled one: checkpoint it so recovery
+            # starts from it, and keep logging its changes
+            journal.network = network
+            journal.attach()
+            journal.checkpoint()
+        logger.info('Network loaded from %s.', split_command[1])
+    elif len(split_command) in (2, 3) and split_command[0].lower() == NETWORK_SNAPSHOT:
+        # network-snapshot <file> [calls] saves a binary snapshot, with calls if asked
+        include_calls = len(split_command) == 3 and split_command[2].lower() == 'calls'
+        network.save_snapshot(split_command[1], include_calls)
+        logger.info('Network snapshot saved to %s.', split_command[1])
+    elif len(split_command) == 3 and split_command[0].lower() == START_CALL:
+        src_number_parts = split_command[1].split(HYPHEN)
+        src_area_code = int(src_number_parts[0])
+        src_number = int(''.join(src_number_parts[1:]))
+
+        dest_number_parts = split_command[2].split(HYPHEN)
+        dest_area_code = int(dest_number_parts[0])
+        dest_number = int(''.join(dest_number_parts[1:]))
+
+        # start a call from source phone
+        switch = network.searchSwitchboards(src_area_code)
+        if switch == None:
+            logger.info("Area code does not exist")
+        else:
+            phone = switch.findPhone(src_number)
+            if phone == None:
+                logger.info("Source phone number does not exist")
+            else:
+                phone.connect(dest_area_code,dest_number)
+
+    elif len(split_command) == 2 and split_command[0].lower() == END_CALL:
+        number_parts = split_command[1].split('-')
+        area_code = int(number_parts[0])
+        number = int(''.join(number_parts[1:]))
+
+        # End the call on the specified phone
+        switch = network.searchSwitchboards(area_code)
+        if switch == None:
+            logger.info("Area code not found")
+        else:
+            phone = switch.findPhone(number)
+            if phone == None:
+                logger.info("Phone not found")
+            else:
+                phone.disconnect()
+
+    elif len(split_command) >= 1 and split_command[0].lower() == DISPLAY:
+        # dispaly network, display [area code] [in-call] [page <n>]
+        area_code, in_call, page = parse_display_options(split_command)
+        network.display(area_code, in_call, page)
+    elif len(split_command) >= 2 and split_command[0].lower() == STATUS_EXPORT:
+        export_status_command(network, split_command)
+    elif len(split_command) == 1 and split_command[0].lower() == TRUNK_STATS:
+        # show how busy each trunk is
+        for stats in network.trunk_stats():
+            circuits = "unlimited" if stats['circuits'] is None else stats['circuits']
+            logger.info("Trunk %s-%s: %s/%s circuits in use, peak %s, blocked %s of %s attempts (%.1f%%)",
+                        stats['ends'][0], stats['ends'][1], stats['in_use'], circuits, stats['peak'],
+                        stats['blocked'], stats['attempts'], 100 * stats['blocking_probability'])
+        logger.info("Calls blocked: %s", network.calls_blocked)
+    elif len(split_command) in (1, 2) and split_command[0].lower() == METRICS:
+        # metrics [file] prints a Prometheus text snapshot, or writes it to a file
+        if not hasattr(network.metrics, 'prometheus_text'):
+            logger.info("Metrics are not kept in memory.")
+        elif len(split_command) == 1:
+            sys.stdout.write(network.metrics.prometheus_text())
+        else:
+            network.metrics.dump(split_command[1])
+            logger.info('Metrics written to %s.', split_command[1])
+    return network
 
 
 if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Operator console for the phone network.')
+    parser.add_argument('--journal', metavar='DIR', help='recover the network from DIR and log every change there')
+    args = parser.parse_args()
+
     # all commands applied by user are written in COMMANDS
     COMMANDS = []
-    the_network = Network()
+    if args.journal:
+        from journal import open_network
+        the_network = open_network(args.journal)
+    else:
+        the_network = Network()
     s = input('Enter command: ')
     while s.strip().lower() != QUIT:
-        split_command = s.split()
-        if len(split_command) == 3 and split_command[0].lower() == SWITCH_CONNECT:
-            area_1 = int(split_command[1])
-            area_2 = int(split_command[2])
-            the_network.connect_switchboards(area_1, area_2)
-            # append the command to the COMMANDS list
-            COMMANDS.append(str(SWITCH_CONNECT + " " + str(area_1) + " " +  str(area_2)))
-
-        elif len(split_command) == 2 and split_command[0].lower() == SWITCH_ADD:
-            the_network.add_switchboard(int(split_command[1]))
-
-            COMMANDS.append(str(SWITCH_ADD + " " + str(split_command[1])))
-
-        elif len(split_command) == 2 and split_command[0].lower() == PHONE_ADD:
-            number_parts = split_command[1].split(HYPHEN)
-            area_code = int(number_parts[0])
-            phone_number = int(''.join(number_parts[1:]))
-            # append the command to the COMMANDS list
-            COMMANDS.append(str(PHONE_ADD + " " + str(area_code) + " " + str(phone_number)))
-
-            switchBoard = the_network.searchSwitchboards(area_code)
-            # add the phone to the specified switchboard
-            if switchBoard == None:
-                print("Invalid area_code, create a new switchboard or enter a valid area code.")
-            else:
-                # phone number exists
-                if switchBoard.checkPhone(phone_number):
-                    print("Phone number already exists in area code")
-                else:
-                    switchBoard.add_phone(phone_number)
-        elif len(split_command) == 2 and split_command[0].lower() == NETWORK_SAVE:
-            the_network.save_network(split_command[1], COMMANDS)
-            print('Network saved to {}.'.format(split_command[1]))
-        elif len(split_command) == 2 and split_command[0].lower() == NETWORK_LOAD:
-            the_network = Network()
-            the_network.load_network(split_command[1])
-            print('Network loaded from {}.'.format(split_command[1]))
-        elif len(split_command) == 3 and split_command[0].lower() == START_CALL:
-            src_number_parts = split_command[1].split(HYPHEN)
-            src_area_code = int(src_number_parts[0])
-            src_number = int(''.join(src_number_parts[1:]))
-
-            dest_number_parts = split_command[2].split(HYPHEN)
-            dest_area_code = int(dest_number_parts[0])
-            dest_number = int(''.join(dest_number_parts[1:]))
-
-            # start a call from source phone
-            switch = the_network.searchSwitchboards(src_area_code)
-            if switch == None:
-                print("Area code does not exist")
-            else:
-                phone = switch.findPhone(src_number)
-                if phone == None:
-                    print("Source phone number does not exist")
-                else:
-                    phone.connect(dest_area_code,dest_number)
-
-        elif len(split_command) == 2 and split_command[0].lower() == END_CALL:
-            number_parts = split_command[1].split('-')
-            area_code = int(number_parts[0])
-            number = int(''.join(number_parts[1:]))
-
-            # End the call on the specified phone
-            switch = the_network.searchSwitchboards(area_code)
-            if switch == None:
-                print("Area code not found")
-            else:
-                phone = switch.findPhone(number)
-                if phone == None:
-                    print("Phone not found")
-                else:
-                    phone.disconnect()
-
-        elif len(split_command) >= 1 and split_command[0].lower() == DISPLAY:
-            # dispaly network
-            the_network.display()
+        the_network = run_command(the_network, s, COMMANDS)
         # prompt for command
         s = input('Enter command: ')
-
+    if the_network.journal is not None:
+        the_network.journal.close()
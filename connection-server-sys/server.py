@@ -0,0 +1,245 @@
+"""
+File: server.py
+Description:
+asyncio TCP (or Unix socket) server speaking the network's operator commands (switch-add,
+phone-add, start-call, end-call, display, ...) to many clients at once, all sharing one Network.
+Each command runs to completion on the event loop before the next one starts, so call setup is
+serialized and two clients can never take the same phone. Clients may pipeline: every complete
+line already received is answered in order with a single write.
+
+Protocol: one command per line. The reply is whatever the command prints, followed by a line
+holding a single ".". Sending "quit" closes the connection.
+
+Also includes a load generator client reporting commands per second and latency percentiles.
+With --metrics-file the server writes the network's metrics as a Prometheus text snapshot to a
+file every --metrics-interval seconds, for a local collector to pick up. With --journal the
+network is recovered from a journal directory and every change is logged there (see journal.py).
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import time
+
+from journal import open_network
+from network import Network, run_command, QUIT
+
+# marks the end of each reply
+END_OF_REPLY = '.'
+# bytes read from a client at a time
+READ_SIZE = 1 << 16
+# seconds between metrics snapshots
+METRICS_INTERVAL = 10.0
+
+
+class NetworkServer:
+    """
+    This class serves one shared Network to many clients
+    """
+    def __init__(self, network=None):
+        self.network = network if network is not None else Network()
+        # commands saved by network-save, shared by every client like the network itself
+        self.commands = []
+        self.clients = 0
+        self.handled = 0
+        # task writing metrics snapshots, kept so the event loop doesn't lose it
+        self.metrics_task = None
+
+    def execute(self, line):
+        """
+        Method to run one command and return what it printed
+        """
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            try:
+                self.network = run_command(self.network, line, self.commands)
+            except (ValueError, IndexError, OSError) as error:
+                print("Error: " + str(error))
+        self.handled += 1
+        return output.getvalue()
+
+    async def handle_client(self, reader, writer):
+        """
+        Method serving one connection until it sends quit or disconnects
+        """
+        self.clients += 1
+        buffered = b''
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                # answer every complete line received so far, keep a partial line for later
+                lines = (buffered + data).split(b'\n')
+                buffered = lines.pop()
+                replies = []
+                closing = False
+                for raw in lines:
+                    line = raw.decode('utf-8', 'replace').strip()
+                    if line.lower() == QUIT:
+                        closing = True
+                        break
+                    replies.append(self.execute(line))
+                    replies.append(END_OF_REPLY + '\n')
+                writer.write(''.join(replies).encode())
+                await writer.drain()
+                if closing:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def dump_metrics(self, filename, interval=METRICS_INTERVAL):
+        """
+        Method to write the network's metrics to a file every interval seconds. A failed
+        write is reported and the next snapshot is tried as usual
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # network-load replaces the network, so look it up each time
+                self.network.metrics.dump(filename)
+            except OSError as error:
+                print("Error writing metrics to " + filename + ": " + str(error))
+
+    async def serve(self, host='127.0.0.1', port=8888, path=None, metrics_file=None,
+                    metrics_interval=METRICS_INTERVAL):
+        """
+        Method to accept clients forever, on a Unix socket if path is given
+        """
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle_client, path)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+        if metrics_file is not None:
+            self.metrics_task = asyncio.create_task(self.dump_metrics(metrics_file, metrics_interval))
+        async with server:
+            await server.serve_forever()
+
+
+async def _connect(host, port, path):
+    if path is not None:
+        return await asyncio.open_unix_connection(path)
+    return await asyncio.open_connection(host, port)
+
+
+async def _read_reply(reader):
+    # read lines up to the end-of-reply marker
+    lines = []
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Server closed the connection")
+        line = line.decode().rstrip('\n')
+        if line == END_OF_REPLY:
+            return lines
+        lines.append(line)
+
+
+async def _load_worker(worker, host, port, path, areas, commands, depth, latencies, seed):
+    # one client: a mix of phone-add, start-call and end-call, up to depth requests in flight
+    rng = random.Random('{}-{}'.format(seed, worker))
+    reader, writer = await _connect(host, port, path)
+    sent = asyncio.Queue(maxsize=depth)
+
+    async def receive():
+        for _ in range(commands):
+            started = await sent.get()
+            await _read_reply(reader)
+            latencies.append(time.perf_counter() - started)
+
+    receiver = asyncio.create_task(receive())
+    phones = []
+    for _ in range(commands):
+        choice = rng.random()
+        if choice < 0.4 or len(phones) < 2:
+            phone = '{}-{}{}'.format(rng.choice(areas), worker, rng.randrange(10 ** 6))
+            phones.append(phone)
+            line = 'phone-add ' + phone
+        elif choice < 0.8:
+            line = 'start-call {} {}'.format(rng.choice(phones), rng.choice(phones))
+        else:
+            line = 'end-call ' + rng.choice(phones)
+        await sent.put(time.perf_counter())
+        writer.write((line + '\n').encode())
+        if sent.full():
+            await writer.drain()
+    await writer.drain()
+    await receiver
+    writer.write((QUIT + '\n').encode())
+    writer.close()
+
+
+async def run_load(host='127.0.0.1', port=8888, path=None, clients=10, commands=10000,
+                   depth=16, switchboards=10, seed=0):
+    """
+    Drives the server with many concurrent clients and returns commands per second and
+    latency percentiles in milliseconds
+    """
+    # set up the switchboards first, over one connection
+    reader, writer = await _connect(host, port, path)
+    areas = list(range(1, switchboards + 1))
+    for area in areas:
+        writer.write('switch-add {}\n'.format(area).encode())
+    for area in areas[1:]:
+        writer.write('switch-connect {} {}\n'.format(area - 1, area).encode())
+    await writer.drain()
+    for _ in range(2 * len(areas) - 1):
+        await _read_reply(reader)
+    writer.write((QUIT + '\n').encode())
+    writer.close()
+
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(_load_worker(worker, host, port, path, areas, commands, depth, latencies, seed)
+                           for worker in range(clients)))
+    seconds = time.perf_counter() - started
+    latencies.sort()
+
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+
+    return {
+        'commands': len(latencies),
+        'seconds': seconds,
+        'commands_per_second': len(latencies) / seconds,
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the phone network, or load test a server.')
+    parser.add_argument('mode', choices=('serve', 'load'))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--unix', default=None, help='Unix socket path instead of TCP')
+    parser.add_argument('--clients', type=int, default=10, help='load: concurrent connections')
+    parser.add_argument('--commands', type=int, default=10000, help='load: commands per connection')
+    parser.add_argument('--depth', type=int, default=16, help='load: requests in flight per connection')
+    parser.add_argument('--metrics-file', default=None, help='serve: file to write metrics snapshots to')
+    parser.add_argument('--metrics-interval', type=float, default=METRICS_INTERVAL,
+                        help='serve: seconds between metrics snapshots')
+    parser.add_argument('--journal', metavar='DIR', default=None,
+                        help='serve: recover the network from DIR and log every change there')
+    args = parser.parse_args()
+
+    if args.mode == 'serve':
+        server = NetworkServer(open_network(args.journal) if args.journal else None)
+        try:
+            asyncio.run(server.serve(args.host, args.port, args.unix, args.metrics_file,
+                                     args.metrics_interval))
+        finally:
+            # network-load may have replaced the network, the journal follows it
+            if server.network.journal is not None:
+                server.network.journal.close()
+    else:
+        results = asyncio.run(run_load(args.host, args.port, args.unix, args.clients,
+                                       args.commands, args.depth))
+        print('{commands} commands in {seconds:.2f}s: {commands_per_second:.0f} commands/s, '
+              'p50 {p50_ms:.2f} ms, p99 {p99_ms:.2f} ms'.format(**results))
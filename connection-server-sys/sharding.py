@@ -0,0 +1,655 @@
+"""
+File: sharding.py
+Description:
+Sharded phone network. Switchboards are split by area code across worker processes, each
+holding the phones of its switchboards and their call state, so phone-add, end-call and calls
+between phones of the same partition run in parallel. A coordinator in the calling process
+owns the trunk graph: routing tables and trunk circuits. Calls between partitions go through
+the coordinator, which asks the two workers about the phones over a pipe and then links them.
+
+Commands are given to ShardedNetwork.execute in batches and answered in order with exactly
+what a single Network would print. Circuits for a call inside a partition are reserved by the
+coordinator before the worker checks the phones, and circuits freed by a worker are returned
+when its batch is answered. The coordinator keeps which phones hold the circuits of each call
+inside a partition, answered or not, so it gives back the caller's circuits before reserving
+for its next call and those of a call being ended, as a single Network would. When a trunk on
+the shortest route of a call is full and the workers have requests outstanding, the coordinator
+waits for their answers before reserving, so every call takes the route, overflows or is blocked
+as in a single Network. Trunk attempt and blocked counters also count calls that then fail on a
+missing or busy phone.
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import multiprocessing
+import os
+import random
+import time
+
+from network import (Network, Phone, Switchboard, run_command, switchboard_lines, write_lines, write_status,
+                     parse_display_options, export_status_command, HYPHEN, SWITCH_CONNECT, SWITCH_ADD,
+                     PHONE_ADD, NETWORK_SAVE, NETWORK_LOAD, NETWORK_SNAPSHOT, START_CALL, END_CALL,
+                     DISPLAY, TRUNK_STATS, STATUS_EXPORT, METRICS, DISPLAY_PAGE_SIZE, JSON)
+
+# requests queued for a worker before they are sent
+BATCH_SIZE = 1024
+
+# what the coordinator decided about the route of a call inside one partition
+ROUTED = 0
+NO_ROUTE = 1
+BLOCKED = 2
+
+# answers to an inspect request
+NO_AREA = 'no-area'
+NO_PHONE = 'no-phone'
+
+
+def partition_of(area_code, partitions):
+    """
+    Returns the worker that owns an area code
+    """
+    return area_code % partitions
+
+
+def _parse_number(text):
+    # "area-number" -> (area code, number), as run_command reads it
+    parts = text.split(HYPHEN)
+    return int(parts[0]), int(''.join(parts[1:]))
+
+
+def _route_is_free(switchboard, area_code):
+    # whether every trunk on the shortest route to an area code has a free circuit
+    path = switchboard.route(area_code)
+    return all(path[i].trunks[path[i + 1].area_code].is_free() for i in range(len(path) - 1))
+
+
+class _CircuitStub:
+    """
+    Stands in for a trunk inside a worker: the coordinator owns the circuits, so releasing
+    one only notes which call to give them back for
+    """
+    __slots__ = ('index', 'call', 'released')
+
+    def __init__(self, index, call, released):
+        self.index = index
+        self.call = call
+        self.released = released
+
+    def release(self):
+        self.released.append(self.call)
+
+
+class _ShardSwitchboard(Switchboard):
+    """
+    Switchboard in a worker. Routes and circuits come from the coordinator's decision for the
+    call being made instead of the worker's own (empty) trunk graph
+    """
+    def connect_call(self, area_code, number, previous_codes=None):
+        if self.network.decision == NO_ROUTE:
+            return None
+        destination = self.network.searchSwitchboards(area_code)
+        if destination is None or destination.findPhone(number) is None:
+            return None
+        return destination
+
+    def reserve_route(self, area_code):
+        if self.network.decision == BLOCKED:
+            return None
+        self.network.reserved = [_CircuitStub(index, self.network.call, self.network.released)
+                                 for index in self.network.trunk_indexes]
+        return self.network.reserved
+
+
+class _ShardNetwork(Network):
+    """
+    The part of the network one worker holds: its switchboards and their phones
+    """
+    def __init__(self):
+        super().__init__()
+        # coordinator's decision for the call being made, see _ShardSwitchboard
+        self.decision = ROUTED
+        self.trunk_indexes = ()
+        self.call = None
+        self.reserved = None
+        # calls that ended and gave their circuits back, returned to the coordinator with each answer
+        self.released = []
+
+    def add_switchboard(self, area_code):
+        if not self.presentSwitchboards(area_code):
+            switchboard = _ShardSwitchboard(area_code)
+            switchboard.network = self
+            self.switchboards.append(switchboard)
+            self.switchboard_index[area_code] = switchboard
+
+    def run(self, line, decision, trunk_indexes, call):
+        """
+        Method to apply one command, returning the calls whose circuits were freed and whether
+        the call made (if any) kept the circuits the coordinator reserved for it
+        """
+        self.decision = decision
+        self.trunk_indexes = trunk_indexes
+        self.call = call
+        self.reserved = None
+        run_command(self, line, [])
+        released = self.released[:]
+        # the circuit stubs hold on to this list, so it is emptied rather than replaced
+        self.released.clear()
+        kept = False
+        if self.reserved is not None:
+            area_code, number = _parse_number(line.split()[1])
+            phone = self.searchSwitchboards(area_code).findPhone(number)
+            kept = phone.circuits is self.reserved
+        return released, kept
+
+    def inspect(self, area_code, number):
+        """
+        Method returning NO_AREA, NO_PHONE, or the (area code, number) the phone is in a call
+        with, None if it is free
+        """
+        switchboard = self.searchSwitchboards(area_code)
+        if switchboard is None:
+            return NO_AREA
+        phone = switchboard.findPhone(number)
+        if phone is None:
+            return NO_PHONE
+        if phone.otherPhone is None:
+            return None
+        return phone.otherPhone.switchboard.area_code, phone.otherPhone.number
+
+    def attach(self, area_code, number, other_area, other_number, trunk_indexes, call):
+        """
+        Method to put a phone in a call made by the coordinator. If the other phone is held
+        here too both are linked and the call owns its circuits, otherwise the other end is
+        a stand-in and the coordinator keeps the circuits
+        """
+        phone = self.searchSwitchboards(area_code).findPhone(number)
+        other_switchboard = self.searchSwitchboards(other_area)
+        if other_switchboard is not None:
+            other = other_switchboard.findPhone(other_number)
+            circuits = [_CircuitStub(index, call, self.released) for index in trunk_indexes]
+        else:
+            other = Phone(other_number, Switchboard(other_area))
+            circuits = []
+        self.restore_call(phone, other, [])
+        phone.circuits = circuits
+        other.circuits = circuits
+
+    def detach(self, area_code, number):
+        """
+        Method to end the call a phone is in, returning the calls whose circuits were freed
+        """
+        self.searchSwitchboards(area_code).findPhone(number).hang_up()
+        released = self.released[:]
+        self.released.clear()
+        return released
+
+    def phone_lines(self, area_code, in_call):
+        """
+        Method returning each switchboard's phone lines as display prints them
+        """
+        return {switchboard.area_code: [phone.display(phone.number) for phone in switchboard.phones
+                                        if not in_call or phone.call is not None]
+                for switchboard in self.selected_switchboards(area_code)}
+
+    def phone_status(self, area_code, in_call):
+        """
+        Method returning the number of phones and of phones in a call, and each switchboard's
+        status export rows
+        """
+        summary = self.status_summary()
+        rows = {switchboard.area_code: list(self.status_rows(switchboard.area_code, in_call))
+                for switchboard in self.selected_switchboards(area_code)}
+        return summary['phones'], sum(1 for switchboard in self.switchboards for phone in switchboard.phones
+                                      if phone.call is not None), rows
+
+
+def _worker(connection):
+    # serve batches of requests until told to stop, answering each batch with a list
+    network = _ShardNetwork()
+    while True:
+        requests = connection.recv()
+        if requests is None:
+            break
+        answers = []
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            for request in requests:
+                op = request[0]
+                if op == 'run':
+                    start = output.tell()
+                    released, kept = network.run(*request[1:])
+                    answers.append((output.getvalue()[start:], released, kept))
+                elif op == 'inspect':
+                    answers.append(network.inspect(*request[1:]))
+                elif op == 'attach':
+                    answers.append(network.attach(*request[1:]))
+                elif op == 'detach':
+                    answers.append(network.detach(*request[1:]))
+                elif op == 'lines':
+                    answers.append(network.phone_lines(*request[1:]))
+                elif op == 'status':
+                    answers.append(network.phone_status(*request[1:]))
+                elif op == 'reset':
+                    network = _ShardNetwork()
+                    answers.append(None)
+        connection.send(answers)
+    connection.close()
+
+
+class ShardedNetwork:
+    """
+    This class runs a phone network across worker processes, one per partition of the area
+    codes. Use it as a context manager or call close() to stop the workers
+    """
+    def __init__(self, partitions=None):
+        self.partitions = partitions or os.cpu_count() or 1
+        # the coordinator's network: every switchboard and trunk, but no phones
+        self.network = Network()
+        self.commands = []
+        # calls between partitions: (area code, number) -> ((area code, number) of the other end, trunks)
+        self.remote_calls = {}
+        # calls inside a partition holding circuits, from when they are asked for until their
+        # circuits are given back: call id -> (trunks, the two phones), and (area code, number)
+        # -> ids of the calls a phone may be in
+        self.local_calls = {}
+        self.phone_calls = {}
+        self._call_ids = itertools.count(1)
+        self.connections = []
+        self.processes = []
+        for _ in range(self.partitions):
+            ours, theirs = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker, args=(theirs,), daemon=True)
+            process.start()
+            theirs.close()
+            self.connections.append(ours)
+            self.processes.append(process)
+        # per worker: requests not sent yet, and what to do with their answers
+        self._pending = [[] for _ in range(self.partitions)]
+        self._handlers = [[] for _ in range(self.partitions)]
+        # per worker: handlers of the batch sent and not answered yet
+        self._in_flight = [None] * self.partitions
+        self._outputs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Method to stop the workers
+        """
+        for i, connection in enumerate(self.connections):
+            self._send(i)
+            self._collect(i)
+            connection.send(None)
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.connections = []
+
+    def _queue(self, worker, request, handler):
+        self._pending[worker].append(request)
+        self._handlers[worker].append(handler)
+        if len(self._pending[worker]) >= BATCH_SIZE:
+            self._send(worker)
+
+    def _send(self, worker):
+        # one batch in flight per worker, so neither side can block on a full pipe
+        self._collect(worker)
+        if self._pending[worker]:
+            self.connections[worker].send(self._pending[worker])
+            self._in_flight[worker] = self._handlers[worker]
+            self._pending[worker] = []
+            self._handlers[worker] = []
+
+    def _collect(self, worker):
+        handlers = self._in_flight[worker]
+        if handlers is not None:
+            self._in_flight[worker] = None
+            for handler, answer in zip(handlers, self.connections[worker].recv()):
+                if handler is not None:
+                    handler(answer)
+
+    def _call(self, worker, *request):
+        # send a request and everything queued before it, and wait for its answer
+        answer = []
+        self._queue(worker, request, answer.append)
+        self._send(worker)
+        self._collect(worker)
+        return answer[0]
+
+    def _barrier(self):
+        # send every queued request, then wait for every answer
+        for worker in range(self.partitions):
+            self._send(worker)
+        for worker in range(self.partitions):
+            self._collect(worker)
+
+    def _outstanding(self):
+        # whether any worker has requests not answered yet
+        return any(self._pending) or any(handlers is not None for handlers in self._in_flight)
+
+    def _hold(self, trunks, phones):
+        # circuits reserved for a call inside a partition between two phones, returning its id
+        call = next(self._call_ids)
+        self.local_calls[call] = (trunks, phones)
+        for phone in phones:
+            self.phone_calls.setdefault(phone, set()).add(call)
+        return call
+
+    def _release(self, calls):
+        # give back the circuits of calls, each only once
+        for call in calls:
+            trunks, phones = self.local_calls.pop(call, (None, ()))
+            if trunks is None:
+                continue
+            for trunk in trunks:
+                trunk.release()
+            for phone in phones:
+                held = self.phone_calls.get(phone)
+                if held is not None:
+                    held.discard(call)
+                    if not held:
+                        del self.phone_calls[phone]
+
+    def _release_phone(self, phone):
+        # the worker ends the phone's current call before its next command, and any other
+        # call the phone was asked into either is that call or failed, so all of them can
+        # be given back now
+        self._release(list(self.phone_calls.get(phone, ())))
+
+    def _slot(self):
+        self._outputs.append('')
+        return len(self._outputs) - 1
+
+    def _answer_run(self, slot, call=None):
+        def handler(answer):
+            text, released, kept = answer
+            self._outputs[slot] = text
+            self._release(released)
+            if call is not None and not kept:
+                self._release((call,))
+        return handler
+
+    def execute(self, lines):
+        """
+        Method to apply a batch of commands, returning what each one printed
+        """
+        self._outputs = []
+        for line in lines:
+            self._dispatch(line)
+        self._barrier()
+        outputs = self._outputs
+        self._outputs = []
+        return outputs
+
+    def _coordinator(self, line):
+        # run a command on the coordinator's network, returning what it printed
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.network = run_command(self.network, line, self.commands)
+        return output.getvalue()
+
+    def _dispatch(self, line):
+        split_command = line.split()
+        name = split_command[0].lower() if split_command else ''
+        slot = self._slot()
+        if name == PHONE_ADD and len(split_command) == 2:
+            area_code, number = _parse_number(split_command[1])
+            self.commands.append(PHONE_ADD + " " + str(area_code) + " " + str(number))
+            worker = partition_of(area_code, self.partitions)
+            self._queue(worker, ('run', line, ROUTED, (), None), self._answer_run(slot))
+        elif name == START_CALL and len(split_command) == 3:
+            self._start_call(slot, line, *_parse_number(split_command[1]), *_parse_number(split_command[2]))
+        elif name == END_CALL and len(split_command) == 2:
+            area_code, number = _parse_number(split_command[1])
+            if (area_code, number) in self.remote_calls:
+                self._outputs[slot] = self._end_remote_call(area_code, number)
+            else:
+                self._release_phone((area_code, number))
+                worker = partition_of(area_code, self.partitions)
+                self._queue(worker, ('run', line, ROUTED, (), None), self._answer_run(slot))
+        elif name == SWITCH_ADD and len(split_command) == 2:
+            added = not self.network.presentSwitchboards(int(split_command[1]))
+            self._outputs[slot] = self._coordinator(line)
+            if added:
+                worker = partition_of(int(split_command[1]), self.partitions)
+                self._queue(worker, ('run', line, ROUTED, (), None), None)
+        elif name == DISPLAY:
+            self._outputs[slot] = self.display(*parse_display_options(split_command))
+        elif name == STATUS_EXPORT and len(split_command) >= 2:
+            self._outputs[slot] = self._export_command(split_command)
+        elif name == TRUNK_STATS:
+            # circuits freed in the workers must be back first
+            self._barrier()
+            self._outputs[slot] = self._coordinator(line)
+        elif name == NETWORK_LOAD and len(split_command) == 2:
+            self._outputs[slot] = self.load_network(split_command[1])
+        elif name == NETWORK_SNAPSHOT:
+            self._outputs[slot] = "Snapshots are not supported by a sharded network.\n"
+        elif name == METRICS:
+            # the workers' phones keep their metrics in the worker processes
+            self._outputs[slot] = "Metrics are not supported by a sharded network.\n"
+        elif name in (SWITCH_CONNECT, NETWORK_SAVE):
+            self._outputs[slot] = self._coordinator(line)
+
+    def _start_call(self, slot, line, area_code, number, other_area, other_number):
+        worker = partition_of(area_code, self.partitions)
+        if (worker == partition_of(other_area, self.partitions)
+                and (area_code, number) not in self.remote_calls):
+            # both phones are in one worker: the coordinator only settles the route
+            switchboard = self.network.searchSwitchboards(area_code)
+            reserved = None
+            if switchboard is None or other_area not in switchboard.routes:
+                decision = NO_ROUTE
+            else:
+                reserved = self._reserve(switchboard, area_code, number, other_area)
+                decision = BLOCKED if reserved is None else ROUTED
+            call = self._hold(reserved, ((area_code, number), (other_area, other_number))) if reserved else None
+            request = ('run', line, decision, tuple(trunk.index for trunk in reserved or ()), call)
+            self._queue(worker, request, self._answer_run(slot, call))
+        else:
+            self._outputs[slot] = self._remote_call(area_code, number, other_area, other_number)
+
+    def _reserve(self, switchboard, area_code, number, other_area):
+        # reserve a route for a call, after the caller's current call is ended
+        self._release_phone((area_code, number))
+        if self._outstanding() and not _route_is_free(switchboard, other_area):
+            # a full trunk may be held by calls the workers have since ended or failed, and it
+            # decides whether the call overflows or is blocked: wait for their answers first
+            self._barrier()
+        return switchboard.reserve_route(other_area)
+
+    def _remote_call(self, area_code, number, other_area, other_number):
+        # a call the coordinator makes itself, printing what Phone.connect would
+        worker = partition_of(area_code, self.partitions)
+        other_worker = partition_of(other_area, self.partitions)
+        source = self._call(worker, 'inspect', area_code, number)
+        if source == NO_AREA:
+            return "Area code does not exist\n"
+        if source == NO_PHONE:
+            return "Source phone number does not exist\n"
+        output = []
+        if source is not None:
+            output.append("Disconnecting current call to make new call\n")
+            output.append(self._hang_up(area_code, number, source))
+        destination = self._call(other_worker, 'inspect', other_area, other_number)
+        switchboard = self.network.searchSwitchboards(area_code)
+        if destination in (NO_AREA, NO_PHONE) or other_area not in switchboard.routes:
+            output.append(str(number) + " and " + str(other_number) + " were not connected.\n")
+            return ''.join(output)
+        if (other_area, other_number) == (area_code, number) or destination is not None:
+            output.append(str(other_number) + " is busy, " + str(number) + " and " + str(other_number) +
+                          " were not connected.\n")
+            return ''.join(output)
+        circuits = self._reserve(switchboard, area_code, number, other_area)
+        if circuits is None:
+            output.append("All trunk lines are busy, " + str(number) + " and " + str(other_number) +
+                          " were not connected.\n")
+            return ''.join(output)
+        indexes = tuple(trunk.index for trunk in circuits)
+        call = None
+        if other_worker == worker and circuits:
+            call = self._hold(circuits, ((area_code, number), (other_area, other_number)))
+        self._queue(worker, ('attach', area_code, number, other_area, other_number, indexes, call), None)
+        if other_worker != worker:
+            self._queue(other_worker, ('attach', other_area, other_number, area_code, number, indexes, None),
+                        None)
+            self.remote_calls[(area_code, number)] = ((other_area, other_number), circuits)
+            self.remote_calls[(other_area, other_number)] = ((area_code, number), circuits)
+        output.append(str(number) + " and " + str(other_number) + " are now connected.\n")
+        return ''.join(output)
+
+    def _hang_up(self, area_code, number, other):
+        # end the call between a phone and other, returning what Phone.disconnect prints
+        other_area, other_number = other
+        released = self._call(partition_of(area_code, self.partitions), 'detach', area_code, number)
+        self._release(released)
+        call = self.remote_calls.pop((area_code, number), None)
+        if call is not None:
+            # the other end is in another worker, and the coordinator holds the circuits
+            self.remote_calls.pop(other, None)
+            self._queue(partition_of(other_area, self.partitions), ('detach', other_area, other_number),
+                        self._release)
+            for trunk in call[1]:
+                trunk.release()
+        return ("Hanging up...\nConnection Terminated.\nDisconnected (" + str(area_code) + "-" + str(number) +
+                ") and (" + str(other_area) + "-" + str(other_number) + ")\n")
+
+    def _end_remote_call(self, area_code, number):
+        return self._hang_up(area_code, number, self.remote_calls[(area_code, number)][0])
+
+    def _gather(self, op, area_code, in_call):
+        # ask the workers holding the selected switchboards, all at once
+        self._barrier()
+        if area_code is None:
+            workers = range(self.partitions)
+        else:
+            workers = [partition_of(area_code, self.partitions)]
+        answers = []
+        for worker in workers:
+            self._queue(worker, (op, area_code, in_call), answers.append)
+            self._send(worker)
+        for worker in workers:
+            self._collect(worker)
+        return answers
+
+    def display(self, area_code=None, in_call=False, page=None, page_size=DISPLAY_PAGE_SIZE):
+        """
+        Method returning the text Network.display prints, with the same options
+        """
+        lines = {}
+        for answer in self._gather('lines', area_code, in_call):
+            lines.update(answer)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            write_lines(itertools.chain.from_iterable(
+                switchboard_lines(switchboard, lines.get(switchboard.area_code, ()))
+                for switchboard in self.network.selected_switchboards(area_code)), page, page_size)
+        return output.getvalue()
+
+    def export_status(self, file, format=JSON, area_code=None, in_call=False):
+        """
+        Method to write the same status export as Network.export_status
+        """
+        phones = 0
+        calling = 0
+        rows = {}
+        for count, in_call_count, worker_rows in self._gather('status', area_code, in_call):
+            phones += count
+            calling += in_call_count
+            rows.update(worker_rows)
+        summary = {'switchboards': len(self.network.switchboards), 'trunks': len(self.network.trunks),
+                   'phones': phones, 'calls': calling // 2, 'calls_blocked': self.network.calls_blocked}
+        write_status(file, format, summary, itertools.chain.from_iterable(
+            rows.get(switchboard.area_code, ()) for switchboard in self.network.selected_switchboards(area_code)))
+
+    def _export_command(self, split_command):
+        # status-export as run_command reads it, returning what it prints
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            export_status_command(self, split_command)
+        return output.getvalue()
+
+    def load_network(self, filename, chunk_lines=BATCH_SIZE * 64):
+        """
+        Method to replace the network with one loaded from a command log
+        """
+        self._barrier()
+        for worker in range(self.partitions):
+            self._call(worker, 'reset')
+        self.network = Network()
+        self.remote_calls = {}
+        self.local_calls = {}
+        self.phone_calls = {}
+        commands = self.commands
+        # the commands of a loaded log are not saved again, as with a single network
+        self.commands = []
+        outputs = self._outputs
+        with open(filename, 'r') as file:
+            chunk = []
+            for line in file:
+                split_command = line.split()
+                if len(split_command) == 3 and split_command[0].lower() == PHONE_ADD:
+                    # the log keeps area code and number apart
+                    line = PHONE_ADD + " " + split_command[1] + HYPHEN + split_command[2]
+                chunk.append(line)
+                if len(chunk) >= chunk_lines:
+                    self.execute(chunk)
+                    chunk = []
+            self.execute(chunk)
+        self._outputs = outputs
+        self.commands = commands
+        return 'Network loaded from {}.\n'.format(filename)
+
+
+def workload(switchboards, phones, calls, local=0.9, partitions=1, seed=0):
+    """
+    Returns commands for a benchmark: switchboards in a ring, phones added, then calls, a
+    fraction local of which stay inside one partition
+    """
+    rng = random.Random(seed)
+    lines = ['switch-add {}'.format(area_code) for area_code in range(1, switchboards + 1)]
+    lines += ['switch-connect {} {}'.format(area_code, area_code % switchboards + 1)
+              for area_code in range(1, switchboards + 1)]
+    numbers = range(1, phones + 1)
+    lines += ['phone-add {}-{}'.format(rng.randint(1, switchboards), number) for number in numbers]
+    areas = {}
+    for line in lines[2 * switchboards:]:
+        area_code, number = line.split()[1].split(HYPHEN)
+        areas.setdefault(int(area_code) % partitions, []).append(area_code + HYPHEN + number)
+    everyone = [phone for group in areas.values() for phone in group]
+    for _ in range(calls):
+        source_group = areas[rng.choice(list(areas))]
+        group = source_group if rng.random() < local else everyone
+        lines.append('start-call {} {}'.format(rng.choice(source_group), rng.choice(group)))
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare a single network with a sharded one.')
+    parser.add_argument('--partitions', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--switchboards', type=int, default=64)
+    parser.add_argument('--phones', type=int, default=200000)
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--local', type=float, default=0.9, help='fraction of calls inside one partition')
+    args = parser.parse_args()
+
+    commands = workload(args.switchboards, args.phones, args.calls, args.local, max(args.partitions))
+    single = Network()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for command in commands:
+            single = run_command(single, command, [])
+    seconds = time.perf_counter() - start
+    print('single network: {:10.0f} commands/s'.format(len(commands) / seconds))
+    for count in args.partitions:
+        with ShardedNetwork(count) as sharded:
+            start = time.perf_counter()
+            for i in range(0, len(commands), BATCH_SIZE * 16):
+                sharded.execute(commands[i:i + BATCH_SIZE * 16])
+            seconds = time.perf_counter() - start
+        print('{:2d} partitions:  {:10.0f} commands/s'.format(count, len(commands) / seconds))
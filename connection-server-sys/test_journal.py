@@ -0,0 +1,69 @@
+"""
+File: test_journal.py
+Description:
+Recovery tests for the write-ahead log.
+"""
+import contextlib
+import io
+import os
+import tempfile
+import time
+import unittest
+
+from journal import LOG_PREFIX, LOG_SUFFIX, _file_name, open_network, recover
+from network import run_command
+
+
+class RecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+
+    def test_torn_record_is_cut_before_appending(self):
+        log = _file_name(self.directory, LOG_PREFIX, 0, LOG_SUFFIX)
+        with open(log, 'w') as file:
+            file.write('1 switch-a')
+        network = open_network(self.directory)
+        network.add_switchboard(1)
+        network.add_switchboard(2)
+        network.journal.close()
+        with open(log) as file:
+            self.assertEqual(file.read(), '1 switch-add 1\n2 switch-add 2\n')
+
+        recovered, sequence = recover(self.directory)
+        self.assertEqual(sequence, 2)
+        self.assertEqual([switchboard.area_code for switchboard in recovered.switchboards], [1, 2])
+
+    def test_quiet_period_syncs_records(self):
+        network = open_network(self.directory, sync_interval=0.01)
+        network.add_switchboard(7)
+        time.sleep(0.2)
+        # read before close, as a crash would leave it
+        recovered, sequence = recover(self.directory)
+        network.journal.close()
+        self.assertEqual(sequence, 1)
+        self.assertEqual([switchboard.area_code for switchboard in recovered.switchboards], [7])
+
+    def test_network_load_keeps_the_journal(self):
+        saved = os.path.join(self.directory, 'saved.txt')
+        with open(saved, 'w') as file:
+            file.write('switch-add 5\n')
+        network = open_network(self.directory)
+        journal = network.journal
+        with contextlib.redirect_stdout(io.StringIO()):
+            network = run_command(network, 'network-load ' + saved, [])
+            network = run_command(network, 'switch-add 6', [])
+        self.assertIs(network.journal, journal)
+        journal.close()
+        os.remove(saved)
+
+        recovered, _ = recover(self.directory)
+        self.assertEqual([switchboard.area_code for switchboard in recovered.switchboards], [5, 6])
+
+
+if __name__ == '__main__':
+    unittest.main()
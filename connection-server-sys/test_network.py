@@ -0,0 +1,111 @@
+"""
+File: test_network.py
+Description:
+Tests for trunk accounting and saving and loading in the single network.
+"""
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from network import Network, run_command
+
+
+def build(lines):
+    network = Network()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for line in lines:
+            network = run_command(network, line, [])
+    return network
+
+
+class TrunkStatsTest(unittest.TestCase):
+    def test_overflow_counts_each_trunk_once(self):
+        # 1-2-3 is the shortest route, 2-3 is full so the call overflows by 1-2-4-3
+        network = build(['switch-add 1', 'switch-add 2', 'switch-add 3', 'switch-add 4',
+                         'switch-connect 1 2', 'switch-connect 2 3 1', 'switch-connect 2 4',
+                         'switch-connect 4 3', 'phone-add 2-1', 'phone-add 3-1', 'phone-add 1-2',
+                         'phone-add 3-2', 'start-call 2-1 3-1', 'start-call 1-2 3-2'])
+        stats = {trunk['ends']: trunk for trunk in network.trunk_stats()}
+        self.assertEqual(stats[(1, 2)]['attempts'], 1)
+        self.assertEqual(stats[(1, 2)]['in_use'], 1)
+        self.assertEqual((stats[(2, 3)]['attempts'], stats[(2, 3)]['blocked']), (2, 1))
+        self.assertEqual(stats[(2, 4)]['attempts'], 1)
+        self.assertEqual(network.calls_blocked, 0)
+
+
+
+class SaveLoadTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+
+    def test_saving_twice_replaces_the_file(self):
+        filename = os.path.join(self.directory, 'network.txt')
+        commands = []
+        network = Network()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for line in ['switch-add 1', 'switch-add 2', 'switch-connect 1 2', 'phone-add 1-5',
+                         'network-save ' + filename, 'network-save ' + filename]:
+                network = run_command(network, line, commands)
+        with open(filename) as file:
+            self.assertEqual(file.read().splitlines(),
+                             ['switch-add 1', 'switch-add 2', 'switch-connect 1 2', 'phone-add 1 5'])
+
+    def test_snapshot_round_trip(self):
+        lines = ['switch-add 1', 'switch-add 2', 'switch-add 3', 'switch-connect 1 2 2', 'switch-connect 2 3',
+                 'switch-connect 1 3 1', 'phone-add 1-5', 'phone-add 1-6', 'phone-add 2-7', 'phone-add 3-8',
+                 'phone-add 3-9', 'start-call 1-5 3-8', 'start-call 1-6 3-9', 'start-call 2-7 1-5']
+        network = build(lines)
+        filename = os.path.join(self.directory, 'network.snap')
+        network.save_snapshot(filename, include_calls=True)
+        loaded = Network()
+        loaded.load_snapshot(filename)
+        # a snapshot holds the state of the trunks, not their counters
+        def trunks(each):
+            return [(stats['ends'], stats['circuits'], stats['in_use']) for stats in each.trunk_stats()]
+        self.assertEqual(trunks(loaded), trunks(network))
+        # both answer the same from here on, calls in progress included
+        for line in ['display', 'end-call 3-9', 'start-call 1-6 2-7', 'start-call 3-8 1-6',
+                     'start-call 2-7 3-9', 'display']:
+            outputs = []
+            for each in (network, loaded):
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    run_command(each, line, [])
+                outputs.append(output.getvalue())
+            self.assertEqual(outputs[0], outputs[1], line)
+        self.assertEqual(trunks(loaded), trunks(network))
+
+    def test_snapshot_without_calls(self):
+        network = build(['switch-add 1', 'switch-add 2', 'switch-connect 1 2 3', 'phone-add 1-5',
+                         'phone-add 2-6', 'start-call 1-5 2-6'])
+        filename = os.path.join(self.directory, 'network.snap')
+        network.save_snapshot(filename)
+        loaded = Network()
+        loaded.load_snapshot(filename)
+        self.assertEqual(loaded.status_summary()['phones'], 2)
+        self.assertEqual([trunk.in_use for trunk in loaded.trunks], [0])
+        self.assertIsNone(loaded.searchSwitchboards(1).findPhone(5).call)
+
+    def test_truncated_snapshot_is_rejected(self):
+        network = build(['switch-add 1', 'switch-add 2', 'switch-connect 1 2 4', 'phone-add 1-5',
+                         'phone-add 2-6', 'start-call 1-5 2-6'])
+        filename = os.path.join(self.directory, 'network.snap')
+        network.save_snapshot(filename, include_calls=True)
+        size = os.path.getsize(filename)
+        for cut in (8, 12, 40):
+            with open(filename, 'r+b') as file:
+                file.truncate(size - cut)
+            with self.assertRaises(ValueError):
+                Network().load_snapshot(filename)
+            network.save_snapshot(filename, include_calls=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+File: test_sharding.py
+Description:
+Checks that a sharded network prints what a single Network does, on random batches of commands
+over trunks with few circuits.
+"""
+import contextlib
+import io
+import random
+import unittest
+
+from network import Network, run_command
+from sharding import ShardedNetwork
+
+
+def random_commands(seed, count=3000, areas=9):
+    """
+    Returns switchboards joined by small trunks, phones, and a random mix of calls, hang ups
+    and displays, some of them naming phones that don't exist
+    """
+    rng = random.Random(seed)
+    codes = list(range(1, areas + 1))
+    lines = ['switch-add {}'.format(code) for code in codes]
+    for code in codes[1:]:
+        lines.append('switch-connect {} {} {}'.format(rng.choice(codes[:code - 1]), code, rng.randint(1, 3)))
+    for _ in range(areas):
+        lines.append('switch-connect {} {} {}'.format(rng.choice(codes), rng.choice(codes), rng.randint(1, 2)))
+    phones = ['{}-{}'.format(rng.choice(codes), number) for number in range(1, 60)]
+    lines += ['phone-add ' + phone for phone in phones]
+    for _ in range(count):
+        choice = rng.random()
+        phone = rng.choice(phones)
+        if choice < 0.55:
+            lines.append('start-call {} {}'.format(phone, rng.choice(phones)))
+        elif choice < 0.6:
+            lines.append('start-call {} {}-{}'.format(phone, rng.choice(codes), rng.randint(60, 70)))
+        elif choice < 0.85:
+            lines.append('end-call ' + phone)
+        elif choice < 0.87:
+            lines.append('display')
+        else:
+            phone = '{}-{}'.format(rng.choice(codes), rng.randint(1, 80))
+            phones.append(phone)
+            lines.append('phone-add ' + phone)
+    lines.append('display')
+    return lines
+
+
+def single_outputs(lines):
+    network = Network()
+    outputs = []
+    for line in lines:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            network = run_command(network, line, [])
+        outputs.append(output.getvalue())
+    return outputs, [trunk.in_use for trunk in network.trunks]
+
+
+class ShardedNetworkTest(unittest.TestCase):
+    def check(self, lines, partitions, batch):
+        expected, in_use = single_outputs(lines)
+        with ShardedNetwork(partitions) as sharded:
+            outputs = []
+            for start in range(0, len(lines), batch):
+                outputs += sharded.execute(lines[start:start + batch])
+            self.assertEqual([trunk.in_use for trunk in sharded.network.trunks], in_use)
+        for line, output, single in zip(lines, outputs, expected):
+            self.assertEqual(output, single, line)
+
+    def test_large_batches_match_a_single_network(self):
+        for seed in range(3):
+            lines = random_commands(seed)
+            for partitions in (1, 3, 4):
+                with self.subTest(seed=seed, partitions=partitions):
+                    self.check(lines, partitions, len(lines))
+
+    def test_small_batches_match_a_single_network(self):
+        self.check(random_commands(7), 3, 1)
+
+    def test_pending_failed_call_does_not_block_a_call_between_partitions(self):
+        lines = ['switch-add 1', 'switch-add 2', 'switch-add 3', 'switch-add 6', 'switch-connect 3 1',
+                 'switch-connect 1 2 1', 'switch-connect 2 6', 'phone-add 3-1', 'phone-add 1-1',
+                 'phone-add 2-1', 'start-call 3-1 6-99', 'start-call 1-1 2-1']
+        self.check(lines, 3, len(lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
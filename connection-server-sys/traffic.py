@@ -0,0 +1,247 @@
+"""
+File: traffic.py
+Description:
+Discrete-event traffic simulator for the phone network. Calls arrive between chosen area codes
+as Poisson processes, last for a holding time drawn from a configurable distribution, and drive
+Phone.connect and Phone.disconnect from a priority queue of events instead of typed commands.
+Reports completed, blocked, busy and dropped calls, call-setup latency and events per second.
+"""
+import argparse
+import heapq
+import math
+import random
+import time
+from array import array
+
+from network import Network, quiet
+
+# kinds of events in the queue, departures sort before arrivals at the same time
+DEPARTURE = 0
+ARRIVAL = 1
+
+
+def exponential(mean):
+    """
+    Holding time distribution: exponential with the given mean
+    """
+    rate = 1.0 / mean
+    return lambda rng: rng.expovariate(rate)
+
+
+def constant(value):
+    """
+    Holding time distribution: always the same value
+    """
+    return lambda rng: value
+
+
+def uniform(low, high):
+    """
+    Holding time distribution: uniform between low and high
+    """
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal(mean, sigma):
+    """
+    Holding time distribution: log-normal with the given mean and shape sigma
+    """
+    mu = math.log(mean) - sigma * sigma / 2
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+
+class TrafficSimulator:
+    """
+    This class runs call traffic through a Network. Each traffic stream is a Poisson process of
+    calls from a random phone in one area code to a random phone in another.
+    """
+    def __init__(self, network, seed=None):
+        self.network = network
+        self.random = random.Random(seed)
+        self.streams = [] # (source switchboard, destination switchboard, rate, holding time)
+        self.reset()
+
+    def reset(self):
+        """
+        Method to clear the counters and pending events
+        """
+        self.now = 0.0
+        self.events = []
+        self._sequence = 0
+        self._next_call = 0
+        self._calls = {} # phone -> id of the call it is in
+        self.attempted = 0
+        self.connected = 0
+        self.completed = 0
+        self.blocked = 0
+        self.busy = 0
+        self.dropped = 0
+        self.failed = 0
+        self.processed = 0
+        self.setup_latency = array('d')
+
+    def add_traffic(self, source_area, destination_area, rate, holding=exponential(180.0)):
+        """
+        Method to add a stream of calls from one area code to another
+        :param rate: mean calls per unit of time
+        :param holding: function taking a random.Random and returning a call's holding time
+        """
+        source = self.network.searchSwitchboards(source_area)
+        destination = self.network.searchSwitchboards(destination_area)
+        if source is None or destination is None:
+            raise ValueError("Area code does not exist")
+        if not source.phones or not destination.phones:
+            raise ValueError("Area code has no phones")
+        self.streams.append((source, destination, rate, holding))
+
+    def _schedule(self, when, kind, data):
+        self._sequence += 1
+        heapq.heappush(self.events, (when, kind, self._sequence, data))
+
+    def _arrival(self, stream):
+        source, destination, rate, holding = self.streams[stream]
+        # the next call of this stream
+        self._schedule(self.now + self.random.expovariate(rate), ARRIVAL, stream)
+
+        caller = self.random.choice(source.phones)
+        callee = self.random.choice(destination.phones)
+        self.attempted += 1
+        if callee is caller or callee.call is not None:
+            self.busy += 1
+            return
+        if caller.call is not None:
+            # the network hangs up the caller's current call to make the new one
+            self._forget(caller)
+            self.dropped += 1
+
+        blocked_before = self.network.calls_blocked
+        start = time.perf_counter()
+        output = caller.connect(destination.area_code, callee.number)
+        self.setup_latency.append(time.perf_counter() - start)
+        if output is None:
+            if self.network.calls_blocked != blocked_before:
+                self.blocked += 1
+            else:
+                self.failed += 1
+            return
+        self.connected += 1
+        self._next_call += 1
+        self._calls[caller] = self._next_call
+        self._calls[callee] = self._next_call
+        self._schedule(self.now + holding(self.random), DEPARTURE, (self._next_call, caller))
+
+    def _forget(self, phone):
+        # remove the bookkeeping for the call phone is in
+        self._calls.pop(phone, None)
+        if phone.otherPhone is not None:
+            self._calls.pop(phone.otherPhone, None)
+
+    def _departure(self, call, caller):
+        if self._calls.get(caller) != call:
+            # the call was already dropped
+            return
+        self._forget(caller)
+        caller.disconnect()
+        self.completed += 1
+
+    def run(self, duration, max_events=None):
+        """
+        Method to simulate the traffic for a span of time
+        :param duration: simulated time to run for
+        :param max_events: stop early after this many events
+        :return: dictionary of results
+        """
+        for stream, (_, _, rate, _) in enumerate(self.streams):
+            self._schedule(self.now + self.random.expovariate(rate), ARRIVAL, stream)
+        end = self.now + duration
+        started = time.perf_counter()
+        events = self.events
+        # the network logs a line for every call, which would dominate the run time
+        with quiet():
+            while events and events[0][0] <= end:
+                if max_events is not None and self.processed >= max_events:
+                    break
+                when, kind, _, data = heapq.heappop(events)
+                self.now = when
+                self.processed += 1
+                if kind == ARRIVAL:
+                    self._arrival(data)
+                else:
+                    self._departure(*data)
+        seconds = time.perf_counter() - started
+        # arrivals past the end are left unprocessed, pending departures stay in the queue
+        self.events = [event for event in events if event[1] == DEPARTURE]
+        heapq.heapify(self.events)
+        return self.results(seconds)
+
+    def results(self, seconds=0.0):
+        """
+        Method returning the counters, latency percentiles and event rate
+        """
+        latencies = sorted(self.setup_latency)
+
+        def percentile(fraction):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1e6
+
+        return {
+            'attempted': self.attempted,
+            'connected': self.connected,
+            'completed': self.completed,
+            'blocked': self.blocked,
+            'busy': self.busy,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'in_progress': len(self._calls) // 2,
+            'blocking_probability': self.blocked / self.attempted if self.attempted else 0.0,
+            'setup_p50_us': percentile(0.50),
+            'setup_p99_us': percentile(0.99),
+            'events': self.processed,
+            'seconds': seconds,
+            'events_per_second': self.processed / seconds if seconds > 0 else 0.0,
+        }
+
+
+def build_network(switchboards, phones, circuits=None, extra_trunks=0, seed=None):
+    """
+    Builds a test network: switchboards with area codes 1..switchboards connected in a ring,
+    plus extra_trunks random chords, each with phones numbered 1..phones
+    """
+    rng = random.Random(seed)
+    network = Network()
+    for area_code in range(1, switchboards + 1):
+        network.add_switchboard(area_code)
+        switchboard = network.searchSwitchboards(area_code)
+        for number in range(1, phones + 1):
+            switchboard.add_phone(number)
+    with quiet():
+        for area_code in range(1, switchboards):
+            network.connect_switchboards(area_code, area_code + 1, circuits)
+        if switchboards > 2:
+            network.connect_switchboards(switchboards, 1, circuits)
+        for _ in range(extra_trunks):
+            network.connect_switchboards(rng.randint(1, switchboards), rng.randint(1, switchboards), circuits)
+    return network
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate call traffic through a phone network.')
+    parser.add_argument('--switchboards', type=int, default=10)
+    parser.add_argument('--phones', type=int, default=1000, help='phones per switchboard')
+    parser.add_argument('--circuits', type=int, default=None, help='circuits per trunk, unlimited if not given')
+    parser.add_argument('--extra-trunks', type=int, default=5, help='random trunks added to the ring')
+    parser.add_argument('--rate', type=float, default=1.0, help='calls per second between each pair of areas')
+    parser.add_argument('--hold', type=float, default=180.0, help='mean holding time in seconds')
+    parser.add_argument('--duration', type=float, default=3600.0, help='simulated seconds')
+    parser.add_argument('--seed', default=None)
+    args = parser.parse_args()
+
+    the_network = build_network(args.switchboards, args.phones, args.circuits, args.extra_trunks, args.seed)
+    simulator = TrafficSimulator(the_network, args.seed)
+    for source_area in range(1, args.switchboards + 1):
+        for destination_area in range(1, args.switchboards + 1):
+            simulator.add_traffic(source_area, destination_area, args.rate, exponential(args.hold))
+    results = simulator.run(args.duration)
+    for name, value in results.items():
+        print('{:<22}{}'.format(name, round(value, 3) if isinstance(value, float) else value))
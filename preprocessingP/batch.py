@@ -0,0 +1,169 @@
+"""
+File to run the preprocessing functions over a whole folder of images
+The program finds every image in an input directory (or matching a glob pattern),
+decodes it, runs a Pipeline of transforms and encodes the result across a pool of
+worker processes, saving into an output directory. Only a bounded number of images is in flight
+at once so memory stays flat no matter how large the dataset is.
+"""
+
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from pipeline import Pipeline, Brightness, Grayscale
+from grayscale import MODES, AVERAGE
+
+# file types picked up when a directory is given instead of a glob
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+# transforms the batch runner knows about by name
+TRANSFORMS = ('brightness', 'grayscale')
+
+# pipeline used by the worker process, set once when the worker starts
+_worker_pipeline = None
+
+
+def build_pipeline(transforms, brightness_value=50, grayscale_mode=AVERAGE):
+    """
+    Builds a Pipeline from a list of transform names, in order
+    """
+    steps = []
+    for name in transforms:
+        if name == 'brightness':
+            steps.append(Brightness(brightness_value))
+        elif name == 'grayscale':
+            steps.append(Grayscale(grayscale_mode))
+        else:
+            raise ValueError("Unknown transform: " + str(name))
+    return Pipeline(*steps)
+
+
+def find_images(source):
+    """
+    Returns the sorted list of image files in a directory, or matching a glob pattern
+    """
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)
+                 if name.lower().endswith(IMAGE_EXTENSIONS)]
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(path for path in paths if os.path.isfile(path))
+
+
+def source_root(source):
+    """
+    Returns the directory images found in source are named relative to: the directory itself,
+    or the part of a glob pattern before its first wildcard
+    """
+    if os.path.isdir(source):
+        return source
+    root = os.path.dirname(source)
+    while glob.has_magic(root):
+        root = os.path.dirname(root)
+    return root or os.curdir
+
+
+class OutputPaths:
+    """
+    Maps each image found in source to where its result is saved: the same path relative to
+    the source root, under output_dir, so files with one name in different folders
+    (cat/001.jpg and dog/001.jpg) don't overwrite each other. Folders are made as needed
+    """
+    def __init__(self, source, output_dir):
+        self.root = source_root(source)
+        self.output_dir = output_dir
+        self._made = set()
+
+    def __call__(self, path):
+        output_path = os.path.join(self.output_dir, os.path.relpath(path, self.root))
+        folder = os.path.dirname(output_path)
+        if folder not in self._made:
+            os.makedirs(folder, exist_ok=True)
+            self._made.add(folder)
+        return output_path
+
+
+def _init_worker(pipeline):
+    # keep one pipeline per worker so its buffers are reused between images
+    global _worker_pipeline
+    _worker_pipeline = pipeline
+
+
+def process_file(source_path, output_path):
+    """
+    Decodes one image, runs the worker's pipeline and encodes the result.
+    Returns True if the image was written
+    """
+    return _worker_pipeline.process_file(source_path, output_path)
+
+
+def process_directory(source, output_dir, pipeline, workers=None, max_in_flight=None):
+    """
+    Runs a pipeline over every image in source, writing results into output_dir.
+    :param source: input directory or glob pattern
+    :param output_dir: directory the transformed images are saved to, keeping the folders
+                       they were found in below source
+    :param pipeline: Pipeline to run, or a list of transform names from TRANSFORMS
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :param max_in_flight: most images submitted but not finished, defaults to 2 per worker
+    :return: dictionary with the number of images processed, failed, seconds and images per second
+    """
+    if not isinstance(pipeline, Pipeline):
+        pipeline = build_pipeline(pipeline)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    os.makedirs(output_dir, exist_ok=True)
+    output_paths = OutputPaths(source, output_dir)
+
+    processed = 0
+    failed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(pipeline,)) as pool:
+        pending = set()
+        for path in find_images(source):
+            # wait for a slot before submitting more work
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.result():
+                        processed += 1
+                    else:
+                        failed += 1
+            pending.add(pool.submit(process_file, path, output_paths(path)))
+        # collect whatever is left
+        for future in wait(pending).done:
+            if future.result():
+                processed += 1
+            else:
+                failed += 1
+    seconds = time.perf_counter() - start
+
+    return {
+        'processed': processed,
+        'failed': failed,
+        'seconds': seconds,
+        'images_per_second': processed / seconds if seconds > 0 else 0.0,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Preprocess a directory of images.')
+    parser.add_argument('source', help='input directory or glob pattern')
+    parser.add_argument('output_dir', help='directory to save the processed images')
+    parser.add_argument('--transform', nargs='+', choices=TRANSFORMS, default=['brightness'],
+                        help='transforms to apply, in order')
+    parser.add_argument('--brightness', type=int, default=50, help='value added by the brightness transform')
+    parser.add_argument('--grayscale-mode', choices=MODES, default=AVERAGE,
+                        help='how the grayscale transform weights the channels')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--max-in-flight', type=int, default=None, help='most images queued at once')
+    args = parser.parse_args()
+
+    stats = process_directory(args.source, args.output_dir,
+                              build_pipeline(args.transform, args.brightness, args.grayscale_mode),
+                              args.workers, args.max_in_flight)
+    print('Processed {} images ({} failed) in {:.2f}s: {:.1f} images/s'.format(
+        stats['processed'], stats['failed'], stats['seconds'], stats['images_per_second']))
@@ -0,0 +1,196 @@
+"""
+File to time the preprocessing kernels
+Generates synthetic images at several resolutions and channel counts and times decoding,
+every transform and encoding separately. For each case it reports throughput, p50 and p99
+latency and peak memory, and the results can be saved to JSON so runs can be compared
+over time. Everything runs offline on the CPU, images are encoded and decoded in memory.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import time
+
+import numpy as np
+import cv2
+
+from image_processing import brighten, brighten_batch
+from grayscale import to_grayscale, grayscale_batch, AVERAGE, BT601
+
+# name, height, width of the frames used by the benchmarks
+RESOLUTIONS = [
+    ('480p', 480, 640),
+    ('1080p', 1080, 1920),
+    ('4K', 2160, 3840),
+]
+
+# channel counts of the synthetic images
+CHANNELS = (1, 3, 4)
+
+# frames in each batch case
+BATCH_SIZE = 8
+
+
+def original_brighten(image, brightness_value=50):
+    # the brightness code as it was before the saturating kernel, kept for comparison
+    return np.clip(image + brightness_value, 0, 255)
+
+
+def original_grayscale(image):
+    # the grayscale code as it was before the integer kernel, kept for comparison
+    return np.mean(image, axis=2).astype(np.uint8)
+
+
+def synthetic_image(rng, height, width, channels):
+    """
+    Returns a smooth gradient with noise, so it compresses like a photo rather than pure noise
+    """
+    rows = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    cols = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    base = (rows + cols) / 2
+    if channels > 1:
+        base = base[..., None] + np.arange(channels, dtype=np.float32) * 20
+    noise = rng.normal(0, 12, size=base.shape)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def _reset_peak_rss():
+    # Linux lets a process reset its own peak memory counter
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident memory of this process in MB
+    """
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KB on Linux and never goes down
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(function, repeats, images_per_call=1):
+    """
+    Calls function repeats times and returns throughput, latency percentiles and peak memory
+    """
+    function() # warm up caches and lazily created buffers
+    _reset_peak_rss()
+    latencies = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        function()
+        latencies[i] = time.perf_counter() - start
+    return {
+        'images_per_second': images_per_call * repeats / latencies.sum(),
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def cases(image, encoded, brightness_value):
+    """
+    Returns (stage, kernel, function, images per call) for everything worth timing on image
+    """
+    out = np.empty_like(image)
+    result = [
+        ('decode', 'imdecode', lambda: cv2.imdecode(encoded, cv2.IMREAD_UNCHANGED), 1),
+        ('encode', 'imencode', lambda: cv2.imencode('.png', image), 1),
+        ('transform', 'brightness_original', lambda: original_brighten(image, brightness_value), 1),
+        ('transform', 'brightness', lambda: brighten(image, brightness_value, out=out), 1),
+    ]
+    if image.ndim == 3:
+        gray = np.empty(image.shape[:2], dtype=np.uint8)
+        batch = np.repeat(image[None], BATCH_SIZE, axis=0)
+        batch_out = np.empty_like(batch)
+        batch_gray = np.empty(batch.shape[:-1], dtype=np.uint8)
+        result += [
+            ('decode', 'imdecode_grayscale', lambda: cv2.imdecode(encoded, cv2.IMREAD_GRAYSCALE), 1),
+            ('transform', 'grayscale_original', lambda: original_grayscale(image), 1),
+            ('transform', 'grayscale_average', lambda: to_grayscale(image, out=gray, mode=AVERAGE), 1),
+            ('transform', 'grayscale_bt601', lambda: to_grayscale(image, out=gray, mode=BT601), 1),
+            ('transform', 'brightness_batch',
+             lambda: brighten_batch(batch, brightness_value, out=batch_out), BATCH_SIZE),
+            ('transform', 'grayscale_batch', lambda: grayscale_batch(batch, out=batch_gray), BATCH_SIZE),
+        ]
+    return result
+
+
+def run_suite(resolutions=RESOLUTIONS, channels=CHANNELS, repeats=20, brightness_value=50, seed=0):
+    """
+    Times every kernel on every resolution and channel count
+    :return: dictionary with information about the machine and a list of results
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for name, height, width in resolutions:
+        for count in channels:
+            image = synthetic_image(rng, height, width, count)
+            encoded = cv2.imencode('.png', image)[1]
+            for stage, kernel, function, per_call in cases(image, encoded, brightness_value):
+                row = {'resolution': name, 'height': height, 'width': width, 'channels': count,
+                       'stage': stage, 'kernel': kernel}
+                row.update(measure(function, repeats, per_call))
+                results.append(row)
+                print('{:>6} x{}  {:<9} {:<20} {:9.1f} img/s  p50 {:8.2f} ms  p99 {:8.2f} ms  '
+                      'peak {:7.1f} MB'.format(name, count, stage, kernel, row['images_per_second'],
+                                               row['p50_ms'], row['p99_ms'], row['peak_rss_mb']))
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'repeats': repeats,
+        'results': results,
+    }
+
+
+def compare(old, new):
+    """
+    Prints how each kernel's throughput changed between two saved runs
+    """
+    def key(row):
+        return (row['resolution'], row['channels'], row['stage'], row['kernel'])
+
+    before = {key(row): row for row in old['results']}
+    for row in new['results']:
+        previous = before.get(key(row))
+        if previous is None:
+            continue
+        change = row['images_per_second'] / previous['images_per_second'] - 1
+        print('{:>6} x{}  {:<9} {:<20} {:+7.1%}'.format(*key(row), change))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the preprocessing kernels.')
+    parser.add_argument('--repeats', type=int, default=20, help='timed calls per case')
+    parser.add_argument('--resolutions', nargs='+', choices=[name for name, _, _ in RESOLUTIONS],
+                        help='resolutions to run, all by default')
+    parser.add_argument('--channels', type=int, nargs='+', default=list(CHANNELS))
+    parser.add_argument('--output', help='JSON file to save the results to')
+    parser.add_argument('--compare', help='JSON file from an earlier run to compare against')
+    args = parser.parse_args()
+
+    chosen = [r for r in RESOLUTIONS if args.resolutions is None or r[0] in args.resolutions]
+    run = run_suite(chosen, args.channels, args.repeats)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(run, file, indent=2)
+        print('Results saved to ' + args.output)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), run)
@@ -0,0 +1,140 @@
+"""
+File to cache decoded images and transform results
+Augmentation jobs run the preprocessing functions on the same files many times. FrameCache
+keeps decoded frames in memory, keyed by the file path, modification time and size (or by
+a hash of the file contents), and evicts the least recently used frames once a byte budget
+is used up. ResultCache does the same for finished results, keyed by the source and the
+transform parameters, so a repeated request returns without recomputing.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+
+import cv2
+
+# memory each cache may use when no budget is given
+DEFAULT_BUDGET = 512 * 1024 * 1024
+
+
+class LRUCache:
+    """
+    Least recently used cache of NumPy arrays with a budget in bytes.
+    Stored arrays are made read-only so a caller cannot change what other callers get back.
+    """
+    def __init__(self, max_bytes=DEFAULT_BUDGET):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """
+        Returns the array stored under key, or None
+        """
+        array = self._entries.get(key)
+        if array is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return array
+
+    def put(self, key, array):
+        """
+        Stores array under key, evicting the oldest entries to stay within the budget.
+        Arrays bigger than the whole budget are not stored.
+        """
+        if array.nbytes > self.max_bytes:
+            return array
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old.nbytes
+        array.flags.writeable = False
+        self._entries[key] = array
+        self.bytes += array.nbytes
+        while self.bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= evicted.nbytes
+            self.evictions += 1
+        return array
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        """
+        Returns the hit, miss and eviction counters and current size
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self._entries), 'bytes': self.bytes}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def file_key(image_path, content_hash=False):
+    """
+    Returns the key identifying the current contents of a file: its path, modification
+    time and size, or a hash of its bytes when content_hash is True
+    """
+    if content_hash:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(image_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    info = os.stat(image_path)
+    return (os.path.abspath(image_path), info.st_mtime_ns, info.st_size)
+
+
+class FrameCache(LRUCache):
+    """
+    Cache of decoded frames in front of cv2.imread. Frames come back read-only, so
+    copy one before changing it in place.
+    """
+    def __init__(self, max_bytes=DEFAULT_BUDGET, content_hash=False):
+        super().__init__(max_bytes)
+        self.content_hash = content_hash
+
+    def imread(self, image_path, flags=cv2.IMREAD_COLOR):
+        """
+        Same as cv2.imread, but only decodes a file the first time it is seen
+        """
+        key = (file_key(image_path, self.content_hash), flags)
+        image = self.get(key)
+        if image is None:
+            image = cv2.imread(image_path, flags)
+            if image is None:
+                return None
+            self.put(key, image)
+        return image
+
+
+class ResultCache(LRUCache):
+    """
+    Cache of transform results keyed by the source file and the transform parameters
+    """
+    def __init__(self, max_bytes=DEFAULT_BUDGET, content_hash=False):
+        super().__init__(max_bytes)
+        self.content_hash = content_hash
+
+    def key(self, image_path, params):
+        return (file_key(image_path, self.content_hash), params)
+
+    def get_or_compute(self, image_path, params, compute):
+        """
+        Returns the result stored for (image_path, params), or stores and returns compute()
+        :param params: hashable description of the transform, e.g. repr of a Pipeline
+        :param compute: function with no arguments making the result
+        """
+        key = self.key(image_path, params)
+        result = self.get(key)
+        if result is None:
+            result = compute()
+            if result is not None:
+                self.put(key, result)
+        return result
@@ -2,19 +2,108 @@
 This file will convert a colored image RGB into a grayscale image
 The program will load a color image, use NumPy to average the RGB values for each pixel,
 creating a single grayscale value and saving it.
+Two weightings are supported: the plain average of the channels and BT.601 luma weights.
+Both are done with integer math a block of pixels at a time, so no float copy of the image is made.
 """
 
 import numpy as np
 import cv2
+
+from image_processing import batch_output
+
+# where the grayscale image is saved when no output path is given
+OUTPUT_PATH = r'C:\Users\obinn\Desktop\brightened_image.jpg'
+
+# ways of combining the channels
+AVERAGE = 'average'
+BT601 = 'bt601'
+MODES = (AVERAGE, BT601)
+
+# BT.601 luma weights (0.114, 0.587, 0.299) in 8 bit fixed point, in the blue, green, red
+# order OpenCV loads images in. They sum to 256 so the result is shifted right by 8
+BT601_WEIGHTS = (29, 150, 77)
+
+# number of pixels converted at a time, keeps the integer scratch buffers small
+BLOCK_PIXELS = 1 << 16
+
+# function converting an already loaded image array to grayscale
+# out can be a preallocated uint8 array (the image shape without the channels) to write into
+def to_grayscale(image, out=None, mode=AVERAGE):
+    if mode not in MODES:
+        raise ValueError("Unknown grayscale mode: " + str(mode))
+    if image.ndim == 2:
+        # already one channel
+        if out is None:
+            return image.copy()
+        out[...] = image
+        return out
+    if out is None:
+        out = np.empty(image.shape[:-1], dtype=np.uint8)
+    if mode == BT601 and image.shape[-1] < 3:
+        raise ValueError("BT.601 needs at least 3 channels")
+    if image.size == 0:
+        # nothing to convert, and an empty image can't be viewed as rows
+        return out
+
+    # view the pixels as rows so they can be walked a block of rows at a time
+    width = image.shape[-2]
+    rows = image.reshape(-1, width, image.shape[-1])
+    out_rows = out.reshape(-1, width)
+    if not np.shares_memory(out_rows, out):
+        # out could not be viewed as rows, convert in one block and copy back
+        out[...] = to_grayscale(np.ascontiguousarray(image), mode=mode)
+        return out
+
+    block = max(1, BLOCK_PIXELS // width)
+    total = np.empty((block, width), dtype=np.uint16)
+    term = np.empty((block, width), dtype=np.uint16)
+    for start in range(0, rows.shape[0], block):
+        pixels = rows[start:start + block]
+        count = pixels.shape[0]
+        acc = total[:count]
+        if mode == AVERAGE:
+            # need to average the channels to convert to grayscale, summed as integers
+            # then divided, same result as the truncated mean
+            np.copyto(acc, pixels[..., 0])
+            for channel in range(1, pixels.shape[-1]):
+                np.add(acc, pixels[..., channel], out=acc)
+            np.floor_divide(acc, pixels.shape[-1], out=out_rows[start:start + count], casting='unsafe')
+        else:
+            # weighted sum, rounded, then scaled back down to 0-255
+            np.multiply(pixels[..., 0], BT601_WEIGHTS[0], out=acc, dtype=np.uint16)
+            for channel in (1, 2):
+                np.multiply(pixels[..., channel], BT601_WEIGHTS[channel], out=term[:count], dtype=np.uint16)
+                np.add(acc, term[:count], out=acc)
+            np.add(acc, 128, out=acc)
+            np.right_shift(acc, 8, out=out_rows[start:start + count], casting='unsafe')
+    return out
+
+# function converting a whole N x H x W x C batch of same-sized frames in one call
+# out can be a caller-owned N x H x W uint8 array or a .npy file name to memory-map
+def grayscale_batch(frames, out=None, mode=AVERAGE):
+    if frames.ndim != 4:
+        raise ValueError("Expected an N x H x W x C batch of frames")
+    return to_grayscale(frames, out=batch_output(out, frames.shape[:-1]), mode=mode)
+
 # function converting image to grayscale for ML model to understand
-def convert_to_grayscale(image_path):
-    image = cv2.imread(image_path) # loads image
-    # need to average the RGB channels to convert to grayscale
-    grayscale_image = np.mean(image, axis=2).astype(np.uint8) # Averages across channels
+# fast_decode asks the decoder for one channel directly, only valid with the BT.601 weights
+# frames can be a cache.FrameCache so a file used many times is only decoded once
+def convert_to_grayscale(image_path, output_path=OUTPUT_PATH, mode=AVERAGE, fast_decode=False,
+                         frames=None):
+    # decode through the cache if there is one
+    imread = frames.imread if frames is not None else cv2.imread
+    if fast_decode:
+        if mode != BT601:
+            raise ValueError("fast_decode only gives BT.601 weights")
+        grayscale_image = imread(image_path, cv2.IMREAD_GRAYSCALE)
+    else:
+        image = imread(image_path) # loads image
+        grayscale_image = to_grayscale(image, mode=mode)
 
     # Save the grayscale image
-    cv2.imwrite(r'C:\Users\obinn\Desktop\brightened_image.jpg', grayscale_image)
+    cv2.imwrite(output_path, grayscale_image)
     return grayscale_image
 
-#example usage
-convert_to_grayscale(r'C:\Users\obinn\Desktop\brightened_image.jpg')
\ No newline at end of file
+if __name__ == '__main__':
+    #example usage
+    convert_to_grayscale(r'C:\Users\obinn\Desktop\brightened_image.jpg')
@@ -1,22 +1,79 @@
 """
 File to load and preprocess images
 Program loads image from a file, uses NumPy to increase the brightness
-by a fixed value
+by a fixed value. Pixels saturate at 0 and 255 and stay uint8 the whole way.
 """
 
 import numpy as np # importy for workingn with arrays
 import cv2 # import for working with images
 
+# where the brightened image is saved when no output path is given
+OUTPUT_PATH = r'C:\Users\obinn\Desktop\brightened_image.jpg'
+
+# Function which brightens a uint8 image that is already loaded as a NumPy array
+# out can be a preallocated uint8 array (or the image itself) to avoid a new allocation
+def brighten(image, brightness_value=50, out=None):
+    # anything past +-255 saturates the same way
+    brightness_value = max(-255, min(255, int(brightness_value)))
+    if out is None:
+        out = np.empty_like(image)
+    if image.size == 0:
+        # nothing to brighten, and an empty image can't be viewed as rows
+        return out
+    if image.flags.c_contiguous and out.flags.c_contiguous and image.ndim >= 2:
+        # OpenCV's saturating add, viewed as one channel 2D so it accepts any shape
+        # and adds the same value to every channel
+        flat_image = image.reshape(image.shape[0], -1)
+        flat_out = out.reshape(out.shape[0], -1)
+        if brightness_value >= 0:
+            cv2.add(flat_image, brightness_value, dst=flat_out)
+        else:
+            cv2.subtract(flat_image, -brightness_value, dst=flat_out)
+    elif brightness_value >= 0:
+        #This adds brightness to each pixel in the image, ensuring pixel stays within 0-255
+        np.minimum(image, 255 - brightness_value, out=out)
+        np.add(out, brightness_value, out=out)
+    else:
+        np.maximum(image, -brightness_value, out=out)
+        np.subtract(out, -brightness_value, out=out)
+    return out
+
+# Function which returns the array a batch result is written into: a new array when out is
+# None, a .npy memmap when out is a file name, otherwise the caller's array after checking it
+def batch_output(out, shape):
+    if out is None:
+        return np.empty(shape, dtype=np.uint8)
+    if isinstance(out, str):
+        return np.lib.format.open_memmap(out, mode='w+', dtype=np.uint8, shape=shape)
+    if out.shape != shape or out.dtype != np.uint8:
+        raise ValueError("Output must be a uint8 array of shape " + str(shape))
+    return out
+
+# Function which brightens a whole N x H x W x C batch of same-sized uint8 frames in one call
+# out can be a caller-owned N x H x W x C array, the frames themselves or a .npy file name
+def brighten_batch(frames, brightness_value=50, out=None):
+    if frames.ndim != 4:
+        raise ValueError("Expected an N x H x W x C batch of frames")
+    out = batch_output(out, frames.shape)
+    if frames.size == 0:
+        # no frames, or frames without pixels
+        return out
+    return brighten(frames, brightness_value, out=out)
+
 # Function which Loads the images using OpenCV
-def adjust_brightness(image_path, brightness_value=50):
-    image = cv2.imread(image_path) #reads image as a NumPy array
-    #This adds brightness to each pixel in the image, ensuring pixel stays within 0-255
-    brightened_image = np.clip(image + brightness_value, 0, 255)
+# frames can be a cache.FrameCache so a file used many times is only decoded once
+def adjust_brightness(image_path, brightness_value=50, output_path=OUTPUT_PATH, frames=None):
+    if frames is not None:
+        image = frames.imread(image_path)
+    else:
+        image = cv2.imread(image_path) #reads image as a NumPy array
+    brightened_image = brighten(image, brightness_value)
 
     #save the new brightened image
     # loads the image from the file amd turns it into a NumPy Array
-    cv2.imwrite(r'C:\Users\obinn\Desktop\brightened_image.jpg', brightened_image)
+    cv2.imwrite(output_path, brightened_image)
     return brightened_image
 
-#example usage
-adjust_brightness(r'C:\Users\obinn\Downloads\893dce4ad3ddfdf0c8487c652216590a (1).jpg',50)
\ No newline at end of file
+if __name__ == '__main__':
+    #example usage
+    adjust_brightness(r'C:\Users\obinn\Downloads\893dce4ad3ddfdf0c8487c652216590a (1).jpg',50)
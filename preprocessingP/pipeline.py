@@ -0,0 +1,163 @@
+"""
+File to chain preprocessing steps into one pass over an image
+A Pipeline holds a list of steps (brightness, grayscale, ...). The image is decoded once,
+every step writes into the decoded array or a reused buffer instead of a new full-size
+array, and the final result is encoded once.
+"""
+
+import numpy as np
+import cv2
+
+from image_processing import brighten
+from grayscale import to_grayscale, AVERAGE, BT601
+
+
+class Brightness:
+    """
+    Step adding a fixed value to every pixel. Works in place on its input.
+    """
+    def __init__(self, brightness_value=50):
+        self.brightness_value = brightness_value
+
+    def output_shape(self, shape):
+        return shape
+
+    def __call__(self, image, out):
+        return brighten(image, self.brightness_value, out=out)
+
+    def __repr__(self):
+        return 'Brightness(' + str(self.brightness_value) + ')'
+
+
+class Grayscale:
+    """
+    Step combining the colour channels into a single channel, by plain average or BT.601 weights.
+    """
+    def __init__(self, mode=AVERAGE):
+        self.mode = mode
+
+    def output_shape(self, shape):
+        if len(shape) == 2:
+            return shape
+        return shape[:2]
+
+    def __call__(self, image, out):
+        if image.ndim == 2:
+            # already one channel
+            return image
+        return to_grayscale(image, out=out, mode=self.mode)
+
+    def __repr__(self):
+        return 'Grayscale(' + repr(self.mode) + ')'
+
+
+class Pipeline:
+    """
+    Composes steps and runs them over a single decoded array.
+    Each step that changes the shape keeps one buffer, reused while images keep the same
+    size, so a run over many same-sized frames allocates only once and a run over mixed
+    sizes never holds more than one buffer per step.
+    """
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self._buffers = {}
+
+    def then(self, step):
+        """
+        Returns a new pipeline with step added to the end
+        """
+        return Pipeline(*(self.steps + [step]))
+
+    def brightness(self, brightness_value=50):
+        return self.then(Brightness(brightness_value))
+
+    def grayscale(self, mode=AVERAGE):
+        return self.then(Grayscale(mode))
+
+    def output_shape(self, shape):
+        """
+        Returns the shape of the result for an input of the given shape
+        """
+        for step in self.steps:
+            shape = step.output_shape(shape)
+        return shape
+
+    def _buffer(self, index, shape):
+        # one buffer per step, replaced when the shape changes
+        buffer = self._buffers.get(index)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+            self._buffers[index] = buffer
+        return buffer
+
+    def run(self, image, in_place=True):
+        """
+        Applies every step to image. The image array is modified in place unless in_place
+        is False (e.g. for a read-only cached frame), and the returned array may be a
+        buffer reused by the next call, so copy it to keep it.
+        """
+        owned = in_place
+        for index, step in enumerate(self.steps):
+            shape = step.output_shape(image.shape)
+            if shape == image.shape and owned:
+                out = image
+            else:
+                out = self._buffer(index, shape)
+            image = step(image, out)
+            owned = image is out
+        return image
+
+    def decode_flags(self):
+        """
+        Returns the cv2.imread flags giving images in the form the first step needs
+        """
+        if self.steps and isinstance(self.steps[0], Grayscale) and self.steps[0].mode == BT601:
+            # only grayscale is needed, let the decoder produce one channel directly
+            return cv2.IMREAD_GRAYSCALE
+        return cv2.IMREAD_COLOR
+
+    def decode(self, source_path, frames=None):
+        """
+        Decodes source_path in the form the first step needs, through a FrameCache if given
+        """
+        flags = self.decode_flags()
+        if frames is not None:
+            return frames.imread(source_path, flags)
+        return cv2.imread(source_path, flags) # loads image
+
+    def process(self, source_path, frames=None, results=None):
+        """
+        Returns the result of running the steps on source_path.
+        :param frames: FrameCache to decode through, its frames are never changed
+        :param results: ResultCache, a repeated identical request is returned from it
+        """
+        def compute():
+            image = self.decode(source_path, frames)
+            if image is None:
+                return None
+            result = self.run(image, in_place=frames is None)
+            if results is not None:
+                # the result may be a reused buffer, the cache needs its own copy
+                result = result.copy()
+            return result
+
+        if results is None:
+            return compute()
+        return results.get_or_compute(source_path, repr(self), compute)
+
+    def process_file(self, source_path, output_path, frames=None, results=None):
+        """
+        Decodes source_path once, runs the steps and encodes the result once.
+        Returns True if the image was written
+        """
+        result = self.process(source_path, frames, results)
+        if result is None:
+            return False
+        return cv2.imwrite(output_path, result)
+
+    def __getstate__(self):
+        # buffers are not worth sending to worker processes
+        return {'steps': self.steps, '_buffers': {}}
+
+    def __repr__(self):
+        return 'Pipeline(' + ', '.join(repr(step) for step in self.steps) + ')'
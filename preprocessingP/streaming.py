@@ -0,0 +1,164 @@
+"""
+File to overlap disk reads, processing and disk writes
+On network storage a blocking read, then compute, then a blocking write leaves the CPU
+idle most of the time. prefetch_images decodes upcoming files on background threads and
+hands the arrays over as a generator, and BackgroundWriter encodes and saves results on
+its own threads. Both have a bounded queue depth, so a slow side holds the other back
+instead of filling memory. OpenCV releases the GIL while decoding and encoding, so threads
+are enough to keep the disk busy.
+"""
+
+import argparse
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from pipeline import Pipeline
+from batch import build_pipeline, find_images, OutputPaths, TRANSFORMS
+from grayscale import MODES, AVERAGE
+
+# decoded images waiting to be used, and results waiting to be saved
+READ_DEPTH = 8
+WRITE_DEPTH = 8
+
+
+def prefetch_images(paths, workers=4, depth=READ_DEPTH, flags=cv2.IMREAD_COLOR):
+    """
+    Yields (path, image) for every path in order, decoding up to depth files ahead
+    on background threads. image is None for files OpenCV could not decode.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for path in paths:
+            pending.append((path, pool.submit(cv2.imread, path, flags)))
+            if len(pending) >= depth:
+                path, future = pending.popleft()
+                yield path, future.result()
+        while pending:
+            path, future = pending.popleft()
+            yield path, future.result()
+
+
+class BackgroundWriter:
+    """
+    Saves images with cv2.imwrite on background threads.
+    write() blocks once depth images are waiting, which keeps memory bounded.
+    An array handed to write() must not be changed afterwards.
+    """
+    def __init__(self, workers=2, depth=WRITE_DEPTH):
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=depth)
+        self._lock = threading.Lock()
+        self._error = None
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            path, image = item
+            try:
+                ok = cv2.imwrite(path, image)
+            except Exception as error:
+                ok = False
+                with self._lock:
+                    self._error = self._error or error
+            with self._lock:
+                if ok:
+                    self.written += 1
+                else:
+                    self.failed += 1
+
+    def write(self, path, image):
+        """
+        Queues image to be saved to path
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put((path, image))
+
+    def close(self):
+        """
+        Waits for every queued image to be saved
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def process_stream(source, output_dir, pipeline, read_workers=4, read_depth=READ_DEPTH,
+                   write_workers=2, write_depth=WRITE_DEPTH):
+    """
+    Runs pipeline over every image in source with reading and writing in the background.
+    :param source: input directory or glob pattern
+    :param output_dir: directory the results are saved to, keeping the folders they were
+                       found in below source
+    :param pipeline: Pipeline to run, or a list of transform names
+    :return: dictionary with the number of images processed, failed, seconds and images per second
+    """
+    if not isinstance(pipeline, Pipeline):
+        pipeline = build_pipeline(pipeline)
+    os.makedirs(output_dir, exist_ok=True)
+    output_paths = OutputPaths(source, output_dir)
+
+    unreadable = 0
+    start = time.perf_counter()
+    with BackgroundWriter(write_workers, write_depth) as writer:
+        images = prefetch_images(find_images(source), read_workers, read_depth, pipeline.decode_flags())
+        for path, image in images:
+            if image is None:
+                unreadable += 1
+                continue
+            result = pipeline.run(image)
+            if result is not image:
+                # the result is a buffer the pipeline reuses for the next image
+                result = result.copy()
+            writer.write(output_paths(path), result)
+    seconds = time.perf_counter() - start
+
+    return {
+        'processed': writer.written,
+        'failed': writer.failed + unreadable,
+        'seconds': seconds,
+        'images_per_second': writer.written / seconds if seconds > 0 else 0.0,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Preprocess images with background reads and writes.')
+    parser.add_argument('source', help='input directory or glob pattern')
+    parser.add_argument('output_dir', help='directory to save the processed images')
+    parser.add_argument('--transform', nargs='+', choices=TRANSFORMS, default=['brightness'],
+                        help='transforms to apply, in order')
+    parser.add_argument('--brightness', type=int, default=50, help='value added by the brightness transform')
+    parser.add_argument('--grayscale-mode', choices=MODES, default=AVERAGE,
+                        help='how the grayscale transform weights the channels')
+    parser.add_argument('--read-workers', type=int, default=4, help='threads decoding images')
+    parser.add_argument('--read-depth', type=int, default=READ_DEPTH, help='images decoded ahead')
+    parser.add_argument('--write-workers', type=int, default=2, help='threads encoding images')
+    parser.add_argument('--write-depth', type=int, default=WRITE_DEPTH, help='results waiting to be saved')
+    args = parser.parse_args()
+
+    stats = process_stream(args.source, args.output_dir,
+                           build_pipeline(args.transform, args.brightness, args.grayscale_mode),
+                           args.read_workers, args.read_depth, args.write_workers, args.write_depth)
+    print('Processed {} images ({} failed) in {:.2f}s: {:.1f} images/s'.format(
+        stats['processed'], stats['failed'], stats['seconds'], stats['images_per_second']))
@@ -0,0 +1,60 @@
+"""
+File to test the grayscale kernels
+"""
+
+import unittest
+
+import numpy as np
+
+from grayscale import to_grayscale, grayscale_batch, AVERAGE, BT601, BT601_WEIGHTS, BLOCK_PIXELS
+
+
+def reference_average(image):
+    # truncated mean of the channels
+    return (image.astype(np.int32).sum(axis=-1) // image.shape[-1]).astype(np.uint8)
+
+
+def reference_bt601(image):
+    # fixed point weighted sum of blue, green and red, rounded
+    weights = np.array(BT601_WEIGHTS, dtype=np.int32)
+    return ((image[..., :3].astype(np.int32) * weights).sum(axis=-1) + 128 >> 8).astype(np.uint8)
+
+
+class GrayscaleTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_matches_numpy(self):
+        # the tall image spans several blocks of rows
+        for shape in [(7, 5, 3), (7, 5, 4), (BLOCK_PIXELS // 100 + 3, 300, 3)]:
+            image = self.rng.integers(0, 256, size=shape, dtype=np.uint8)
+            with self.subTest(shape=shape):
+                np.testing.assert_array_equal(to_grayscale(image, mode=AVERAGE), reference_average(image))
+                np.testing.assert_array_equal(to_grayscale(image, mode=BT601), reference_bt601(image))
+
+    def test_extremes(self):
+        image = np.array([[[255, 255, 255], [0, 0, 0], [255, 0, 0], [0, 0, 255]]], dtype=np.uint8)
+        np.testing.assert_array_equal(to_grayscale(image, mode=BT601), reference_bt601(image))
+        np.testing.assert_array_equal(to_grayscale(image, mode=AVERAGE), reference_average(image))
+
+    def test_out_arrays(self):
+        image = self.rng.integers(0, 256, size=(16, 9, 3), dtype=np.uint8)
+        out = np.empty((16, 9), dtype=np.uint8)
+        self.assertIs(to_grayscale(image, out=out, mode=BT601), out)
+        np.testing.assert_array_equal(out, reference_bt601(image))
+        # a strided out can't be viewed as rows
+        wide = np.zeros((16, 18), dtype=np.uint8)
+        to_grayscale(image, out=wide[:, ::2])
+        np.testing.assert_array_equal(wide[:, ::2], reference_average(image))
+
+    def test_batch_matches_numpy(self):
+        frames = self.rng.integers(0, 256, size=(4, 10, 12, 3), dtype=np.uint8)
+        np.testing.assert_array_equal(grayscale_batch(frames, mode=BT601), reference_bt601(frames))
+
+    def test_empty_images(self):
+        for shape in [(0, 5, 3), (5, 0, 3)]:
+            self.assertEqual(to_grayscale(np.zeros(shape, dtype=np.uint8)).shape, shape[:-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
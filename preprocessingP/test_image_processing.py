@@ -0,0 +1,56 @@
+"""
+File to test the brightness kernels
+"""
+
+import unittest
+
+import numpy as np
+
+from image_processing import brighten, brighten_batch
+
+
+def reference_brighten(image, brightness_value):
+    # plain NumPy in a wider type, clipped back to 0-255
+    return np.clip(image.astype(np.int16) + brightness_value, 0, 255).astype(np.uint8)
+
+
+class BrightenTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_matches_numpy(self):
+        for shape in [(31, 17), (31, 17, 1), (31, 17, 3), (9, 7, 4)]:
+            image = self.rng.integers(0, 256, size=shape, dtype=np.uint8)
+            for value in (-300, -40, 0, 1, 50, 255, 400):
+                with self.subTest(shape=shape, value=value):
+                    expected = reference_brighten(image, max(-255, min(255, value)))
+                    np.testing.assert_array_equal(brighten(image, value), expected)
+                    # a strided view takes the NumPy path rather than OpenCV's
+                    np.testing.assert_array_equal(brighten(image[:, ::2], value), expected[:, ::2])
+
+    def test_in_place(self):
+        image = self.rng.integers(0, 256, size=(20, 30, 3), dtype=np.uint8)
+        expected = reference_brighten(image, 70)
+        self.assertIs(brighten(image, 70, out=image), image)
+        np.testing.assert_array_equal(image, expected)
+
+    def test_batch_matches_numpy(self):
+        frames = self.rng.integers(0, 256, size=(3, 12, 10, 3), dtype=np.uint8)
+        np.testing.assert_array_equal(brighten_batch(frames, -25), reference_brighten(frames, -25))
+
+    def test_empty_images(self):
+        for shape in [(0, 5, 3), (5, 0, 3), (0, 0), (4, 0)]:
+            image = np.zeros(shape, dtype=np.uint8)
+            self.assertEqual(brighten(image, 50).shape, shape)
+            out = np.empty(shape, dtype=np.uint8)
+            self.assertIs(brighten(image, -20, out=out), out)
+
+    def test_empty_batches(self):
+        for shape in [(0, 4, 5, 3), (2, 4, 0, 3)]:
+            frames = np.zeros(shape, dtype=np.uint8)
+            self.assertEqual(brighten_batch(frames, 50).shape, shape)
+            self.assertIs(brighten_batch(frames, 50, out=frames), frames)
+
+
+if __name__ == '__main__':
+    unittest.main()
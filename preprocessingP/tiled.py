@@ -0,0 +1,94 @@
+"""
+File to preprocess images too large to hold in memory
+The source is a memory-mapped .npy file (or raw uint8 file with a known shape) and the
+result is written into a memory-mapped output of the same kind. The image is walked one
+fixed-size tile at a time through a Pipeline, so peak memory depends on the tile size
+and not on the image size. Every step works pixel by pixel, so the output is identical
+to running the pipeline on the whole frame.
+"""
+
+import argparse
+
+import numpy as np
+
+from pipeline import Pipeline
+from batch import build_pipeline, TRANSFORMS
+from grayscale import MODES, AVERAGE
+
+# height and width of the tiles when none is given
+TILE_SIZE = (1024, 1024)
+
+
+def open_source(path, shape=None):
+    """
+    Opens a .npy file, or a raw uint8 file of the given shape, as a read-only memory map
+    """
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode='r')
+    if shape is None:
+        raise ValueError("A shape is needed to read a raw file")
+    return np.memmap(path, dtype=np.uint8, mode='r', shape=tuple(shape))
+
+
+def open_output(path, shape):
+    """
+    Creates a writable memory map for the result, as .npy if the name ends in .npy, else raw uint8
+    """
+    if path.endswith('.npy'):
+        return np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=shape)
+    return np.memmap(path, dtype=np.uint8, mode='w+', shape=shape)
+
+
+def process_tiled(source, output_path, pipeline, tile_size=TILE_SIZE, shape=None):
+    """
+    Runs pipeline over the source image one tile at a time.
+    :param source: path of a .npy or raw file, or an array (for example a memmap) already opened
+    :param output_path: where the result is written, .npy or raw
+    :param pipeline: Pipeline to run, or a list of transform names
+    :param tile_size: (height, width) of each tile
+    :param shape: shape of a raw source file
+    :return: the output memory map
+    """
+    if not isinstance(pipeline, Pipeline):
+        pipeline = build_pipeline(pipeline)
+    if isinstance(source, str):
+        source = open_source(source, shape)
+    if source.dtype != np.uint8:
+        raise ValueError("Tiled processing needs a uint8 source")
+
+    height, width = source.shape[:2]
+    output = open_output(output_path, pipeline.output_shape(source.shape))
+    tile_height, tile_width = tile_size
+    # one tile buffer reused for every tile, edge tiles use the top-left part of it
+    tile = np.empty((tile_height, tile_width) + source.shape[2:], dtype=np.uint8)
+
+    for top in range(0, height, tile_height):
+        bottom = min(top + tile_height, height)
+        for left in range(0, width, tile_width):
+            right = min(left + tile_width, width)
+            view = tile[:bottom - top, :right - left]
+            # read the tile from the mapped file into memory, transform, write it back out
+            np.copyto(view, source[top:bottom, left:right])
+            output[top:bottom, left:right] = pipeline.run(view)
+        # write finished rows of tiles to disk so dirty pages do not pile up
+        output.flush()
+    return output
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Preprocess a very large image tile by tile.')
+    parser.add_argument('source', help='.npy file or raw uint8 file')
+    parser.add_argument('output', help='.npy or raw file to write')
+    parser.add_argument('--shape', type=int, nargs='+', help='height width [channels] of a raw source')
+    parser.add_argument('--tile', type=int, nargs=2, default=TILE_SIZE, help='tile height and width')
+    parser.add_argument('--transform', nargs='+', choices=TRANSFORMS, default=['brightness'],
+                        help='transforms to apply, in order')
+    parser.add_argument('--brightness', type=int, default=50, help='value added by the brightness transform')
+    parser.add_argument('--grayscale-mode', choices=MODES, default=AVERAGE,
+                        help='how the grayscale transform weights the channels')
+    args = parser.parse_args()
+
+    process_tiled(args.source, args.output,
+                  build_pipeline(args.transform, args.brightness, args.grayscale_mode),
+                  tuple(args.tile), args.shape)
+    print('Saved ' + args.output)
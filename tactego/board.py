@@ -0,0 +1,301 @@
+"""
+File:    board.py
+Description:
+Compact board for Tactego. The board is one flat array of signed bytes, row by row: 0 is an
+empty square, a positive value is a red piece and a negative value a blue piece, the absolute
+value being the piece type's code. Piece types are interned from the pieces file, so moves,
+combat and winner checks are integer operations and copying a board is one array copy.
+The string view ("R7", "BF", "") used to draw the board is produced on demand.
+
+The board also keeps each player's piece positions, flag positions, material and the number
+of squares holding each value up to date as moves are made and taken back, so counting
+pieces, finding a winner or a player without movable pieces doesn't scan the board.
+"""
+import hashlib
+from array import array
+
+EMPTY = 0
+
+# owners, also the sign of a player's pieces on the board
+RED = 1
+BLUE = -1
+PLAYERS = {'red': RED, 'blue': BLUE}
+PLAYER_NAMES = {RED: 'red', BLUE: 'blue'}
+PREFIXES = {RED: 'R', BLUE: 'B'}
+
+# piece names with special rules, every other name is a numeric rank
+FLAG = 'F'
+ASSASSIN = 'A'
+
+# code marking a piece whose type a player hasn't seen, in that player's view of the board
+UNKNOWN = 127
+
+
+class PieceSet:
+    """
+    The piece types of a pieces file, numbered 1, 2, ... in the order they are listed
+    """
+    def __init__(self, counts, digest=None):
+        """
+        :param counts: list of (name, number of pieces) pairs, as read from a pieces file
+        :param digest: SHA-256 of the pieces file, by default of the pairs written one per line
+        """
+        if digest is None:
+            digest = hashlib.sha256(''.join('{} {}\n'.format(name, count)
+                                            for name, count in counts).encode()).digest()
+        self.digest = digest
+        # names[code] is the name of the piece type with that code, code 0 is unused
+        self.names = ['']
+        self.counts = [0]
+        self.codes = {}
+        for name, count in counts:
+            if name not in self.codes:
+                self.codes[name] = len(self.names)
+                self.names.append(name)
+                self.counts.append(0)
+            self.counts[self.codes[name]] += count
+        if len(self.names) > UNKNOWN:
+            raise ValueError("Too many piece types for a signed byte board")
+        self.flag = self.codes.get(FLAG, 0)
+        self.assassin = self.codes.get(ASSASSIN, 0)
+        # numeric rank of each code, 0 for flags and assassins
+        self.ranks = [0] * len(self.names)
+        for name, code in self.codes.items():
+            if name not in (FLAG, ASSASSIN):
+                if not name.isdigit():
+                    raise ValueError("Unknown piece type: " + name)
+                self.ranks[code] = int(name)
+        # beats[attacker][defender] is 1 when the attacking type wins, worked out once here
+        self.beats = [bytes(self._attacker_wins(attacker, defender) for defender in range(len(self.names)))
+                      for attacker in range(len(self.names))]
+        # material value of each code: rank + 1, an assassin is worth the highest rank and a
+        # flag nothing, since losing it ends the game
+        self.values = [rank + 1 for rank in self.ranks]
+        self.values[0] = 0
+        if self.assassin:
+            self.values[self.assassin] = max(self.ranks) + 1
+        if self.flag:
+            self.values[self.flag] = 0
+
+    @classmethod
+    def from_file(cls, pieces_file):
+        """
+        Reads a pieces file: one "name count" pair per line
+        """
+        counts = []
+        with open(pieces_file, 'rb') as file:
+            data = file.read()
+        for line in data.decode().splitlines():
+            line = line.strip().split()
+            if len(line) == 2:
+                counts.append((line[0], int(line[1])))
+        return cls(counts, hashlib.sha256(data).digest())
+
+    def army(self):
+        """
+        Returns one player's piece codes in the order the pieces file lists them
+        """
+        return [code for code in range(1, len(self.names)) for _ in range(self.counts[code])]
+
+    def attacker_wins(self, attacker, defender):
+        """
+        Combat between two piece types (codes, without owner)
+        """
+        return self.beats[attacker][defender] == 1
+
+    def _attacker_wins(self, attacker, defender):
+        # the rules: a flag is always captured, an assassin defeats any piece it attacks and
+        # is defeated by any piece attacking it, otherwise the higher rank wins and the
+        # attacker wins a tie
+        if defender == self.flag or attacker == self.assassin or defender == self.assassin:
+            return True
+        return self.ranks[attacker] >= self.ranks[defender]
+
+    def label(self, value):
+        """
+        Returns the string for a square: "" when empty, otherwise the owner's letter and the
+        piece name
+        """
+        if value == EMPTY:
+            return ''
+        if value > 0:
+            return 'R' + self.names[value]
+        return 'B' + self.names[-value]
+
+
+class Board:
+    """
+    This class holds the squares of a Tactego board, the piece set they are drawn from and
+    running totals about the pieces on it. Lists kept per player are indexed by the owner,
+    [unused, RED, BLUE], so BLUE (-1) reads the last item. Code writing cells directly must
+    call recount afterwards
+    """
+    __slots__ = ('length', 'width', 'pieces', 'cells', 'tally', 'positions', 'where', 'flags',
+                 'material')
+
+    def __init__(self, length, width, pieces, cells=None):
+        self.length = length
+        self.width = width
+        self.pieces = pieces
+        self.cells = array('b', bytes(length * width)) if cells is None else cells
+        self.recount()
+
+    def recount(self):
+        """
+        Works out the running totals from the squares
+        """
+        # squares holding each value, indexed by the value: negative values read from the end
+        self.tally = [0] * 256
+        # positions of each player's pieces, in no particular order
+        self.positions = [None, [], []]
+        # where[position] is the index of position in its owner's positions list
+        self.where = array('l', bytes(len(self.cells) * array('l').itemsize))
+        # positions of each player's flags
+        self.flags = [None, set(), set()]
+        # total value of each player's pieces
+        self.material = [None, 0, 0]
+        self.tally[EMPTY] = len(self.cells)
+        for position, value in enumerate(self.cells):
+            if value != EMPTY:
+                self._add(position, value)
+
+    def copy(self):
+        """
+        Returns an independent copy of the board, sharing the piece set
+        """
+        return Board(self.length, self.width, self.pieces, array('b', self.cells))
+
+    def index(self, row, col):
+        """
+        Returns the position of a square in cells, or raises IndexError if it is off the board
+        """
+        if not (0 <= row < self.length and 0 <= col < self.width):
+            raise IndexError("Position is off the board")
+        return row * self.width + col
+
+    def get(self, row, col):
+        return self.cells[self.index(row, col)]
+
+    def owner(self, row, col):
+        """
+        Returns RED, BLUE or EMPTY for a square
+        """
+        value = self.get(row, col)
+        return (value > 0) - (value < 0)
+
+    def is_flag(self, row, col):
+        value = self.get(row, col)
+        return value != EMPTY and abs(value) == self.pieces.flag
+
+    def movable(self, player):
+        """
+        Returns the number of the player's pieces that can move, i.e. that aren't flags
+        """
+        return len(self.positions[player]) - len(self.flags[player])
+
+    def move(self, start, stop):
+        """
+        Moves the piece at start to stop, fighting whatever is there. The attacker takes the
+        square if it wins and is removed otherwise
+        """
+        self.make(self.index(*start), self.index(*stop))
+
+    def make(self, source, target):
+        """
+        Plays a move between two flat positions (see index) and returns what unmake needs to
+        take it back, so searches can try moves on one board instead of copying it
+        """
+        cells = self.cells
+        piece = cells[source]
+        defender = cells[target]
+        cells[source] = EMPTY
+        if defender == EMPTY:
+            cells[target] = piece
+            self._relocate(source, target, piece)
+        elif self.pieces.beats[abs(piece)][abs(defender)]:
+            self._remove(target, defender)
+            cells[target] = piece
+            self._relocate(source, target, piece)
+        else:
+            self._remove(source, piece)
+        return source, target, piece, defender
+
+    def unmake(self, undo):
+        """
+        Takes back a move played by make
+        """
+        source, target, piece, defender = undo
+        if self.cells[target] == piece:
+            self._relocate(target, source, piece)
+            if defender != EMPTY:
+                self._add(target, defender)
+        else:
+            self._add(source, piece)
+        self.cells[source] = piece
+        self.cells[target] = defender
+
+    def _add(self, position, value):
+        # counts a piece put on a square
+        player = RED if value > 0 else BLUE
+        positions = self.positions[player]
+        self.where[position] = len(positions)
+        positions.append(position)
+        self.tally[value] += 1
+        self.tally[EMPTY] -= 1
+        self.material[player] += self.pieces.values[abs(value)]
+        if abs(value) == self.pieces.flag:
+            self.flags[player].add(position)
+
+    def _remove(self, position, value):
+        # counts a piece taken off a square, the last of its owner's positions fills its place
+        player = RED if value > 0 else BLUE
+        positions = self.positions[player]
+        last = positions.pop()
+        if last != position:
+            index = self.where[position]
+            positions[index] = last
+            self.where[last] = index
+        self.tally[value] -= 1
+        self.tally[EMPTY] += 1
+        self.material[player] -= self.pieces.values[abs(value)]
+        if abs(value) == self.pieces.flag:
+            self.flags[player].discard(position)
+
+    def _relocate(self, source, target, value):
+        # follows a piece moving to an empty square
+        player = RED if value > 0 else BLUE
+        index = self.where[source]
+        self.positions[player][index] = target
+        self.where[target] = index
+        if abs(value) == self.pieces.flag:
+            self.flags[player].discard(source)
+            self.flags[player].add(target)
+
+    def count(self, value):
+        """
+        Returns the number of squares holding value, e.g. RED * pieces.flag
+        """
+        return self.tally[value]
+
+    def rows(self):
+        """
+        Returns the board as a list of rows of strings like "R7" or "BF", for drawing
+        """
+        label = self.pieces.label
+        cells = self.cells
+        return [[label(cells[start + col]) for col in range(self.width)]
+                for start in range(0, len(cells), self.width)]
+
+    @classmethod
+    def from_rows(cls, rows, pieces):
+        """
+        Builds a board from its string view, the reverse of rows()
+        """
+        board = cls(len(rows), len(rows[0]) if rows else 0, pieces)
+        for i, row in enumerate(rows):
+            for j, label in enumerate(row):
+                if label:
+                    sign = RED if label[0] == 'R' else BLUE
+                    board.cells[i * board.width + j] = sign * pieces.codes[label[1:]]
+        board.recount()
+        return board
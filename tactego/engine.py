@@ -0,0 +1,300 @@
+"""
+File:    engine.py
+Description:
+Headless Tactego engine and self-play simulator. Game plays the same game as tactego() with
+moves chosen by policies instead of input(): reset, legal_moves, step and winner. A policy
+is any function taking the game and a random.Random and returning a move, random_policy
+picks uniformly among the legal moves.
+
+The batch runner plays many seeded games across a process pool and reports win rates, game
+length percentiles and games per second for each pieces file and board size. Game number i
+of a run with seed S is seeded with the string "S-i", the way tactego seeds random with
+what the player types, so any game can be replayed on its own whichever worker played it.
+With a record directory each task also writes the records of its games to a file there (see
+record.py).
+"""
+import argparse
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from board import PieceSet, RED, BLUE, PLAYER_NAMES
+from record import RecordWriter
+from tactego import setup_board, get_winner, move_piece
+
+# result of a game that reached the turn limit
+DRAW = 'draw'
+# moves after which a game is a draw
+MAX_TURNS = 10000
+# games each worker plays per task
+CHUNK_GAMES = 500
+
+
+class Game:
+    """
+    This class holds one game of Tactego: the board, whose turn it is and the result so far.
+    By default a piece may move to any square not holding one of its owner's pieces, as in
+    tactego(); with adjacent it moves one square up, down, left or right
+    """
+    def __init__(self, pieces, length, width, adjacent=False, max_turns=MAX_TURNS):
+        self.pieces = pieces
+        self.length = length
+        self.width = width
+        self.adjacent = adjacent
+        self.max_turns = max_turns
+        self.board = None
+        self.player = RED
+        self.turns = 0
+        self.result = None
+        self.rng = random.Random()
+
+    def reset(self, seed=None):
+        """
+        Method to start a new game, laid out as tactego() lays it out after random.seed(seed)
+        :return: the board
+        """
+        self.rng = random.Random(seed)
+        self.board = setup_board(self.length, self.width, self.pieces, self.rng)
+        self.player = RED
+        self.turns = 0
+        self.result = None
+        self._check_result()
+        return self.board
+
+    def _movable(self, player):
+        # flat positions of the player's pieces other than flags, in board order
+        flags = self.board.flags[player]
+        return sorted(i for i in self.board.positions[player] if i not in flags)
+
+    def _can_move_anywhere(self, player):
+        # whether a piece that may go to any square has a move: the player has a piece that
+        # isn't a flag and doesn't hold every square
+        board = self.board
+        return board.movable(player) > 0 and len(board.positions[player]) < len(board.cells)
+
+    def _targets(self, position, player):
+        # flat positions a piece at position can move to
+        cells = self.board.cells
+        width = self.width
+        if self.adjacent:
+            row, col = divmod(position, width)
+            around = []
+            if row > 0:
+                around.append(position - width)
+            if row < self.length - 1:
+                around.append(position + width)
+            if col > 0:
+                around.append(position - 1)
+            if col < width - 1:
+                around.append(position + 1)
+        else:
+            around = range(len(cells))
+        return [i for i in around if cells[i] * player <= 0]
+
+    def legal_moves(self):
+        """
+        Method returning every move the player to move can make, as ((row, col), (row, col))
+        """
+        width = self.width
+        return [(divmod(start, width), divmod(stop, width))
+                for start in self._movable(self.player) for stop in self._targets(start, self.player)]
+
+    def has_moves(self, player):
+        """
+        Method to check whether a player has any move
+        """
+        if not self.adjacent:
+            return self._can_move_anywhere(player)
+        return any(self._targets(start, player) for start in self._movable(player))
+
+    def random_move(self, rng):
+        """
+        Method returning a legal move chosen uniformly, or None if there is none. Without
+        adjacent every piece has the same targets, so a piece and then a target square are
+        drawn without listing every move
+        """
+        if self.adjacent:
+            moves = self.legal_moves()
+            return rng.choice(moves) if moves else None
+        if not self._can_move_anywhere(self.player):
+            return None
+        cells = self.board.cells
+        start = rng.choice(self._movable(self.player))
+        while True:
+            stop = rng.randrange(len(cells))
+            if cells[stop] * self.player <= 0:
+                return divmod(start, self.width), divmod(stop, self.width)
+
+    def step(self, move):
+        """
+        Method to play a move for the player to move and pass the turn
+        :return: the winner ('red', 'blue' or DRAW) if the game is over, None otherwise
+        """
+        if self.result is not None:
+            raise ValueError("The game is over")
+        move_piece(move, self.board)
+        self.player = -self.player
+        self.turns += 1
+        self._check_result()
+        return self.result
+
+    def _check_result(self):
+        self.result = get_winner(self.board)
+        if self.result is None:
+            if not self.has_moves(self.player):
+                # a player who can't move loses
+                self.result = PLAYER_NAMES[-self.player]
+            elif self.turns >= self.max_turns:
+                self.result = DRAW
+
+    def winner(self):
+        """
+        Method returning 'red', 'blue', DRAW, or None while the game goes on
+        """
+        return self.result
+
+
+def random_policy(game, rng):
+    """
+    Policy choosing uniformly among the legal moves
+    """
+    return game.random_move(rng)
+
+
+def play_game(game, seed, red_policy=random_policy, blue_policy=random_policy, record=None):
+    """
+    Plays one game to the end
+    :param record: binary file to append the game's record to, if any
+    :return: (winner, number of moves)
+    """
+    game.reset(seed)
+    writer = RecordWriter(record, game.board, seed) if record is not None else None
+    policies = {RED: red_policy, BLUE: blue_policy}
+    while game.result is None:
+        move = policies[game.player](game, game.rng)
+        game.step(move)
+        if writer is not None:
+            writer.add(move)
+    if writer is not None:
+        writer.close()
+    return game.result, game.turns
+
+
+def game_seed(seed, index):
+    """
+    Returns the seed of game number index of a run seeded with seed
+    """
+    return '{}-{}'.format(seed, index)
+
+
+def record_filename(record_dir, pieces_file, length, width, first):
+    """
+    Returns the file the games from number first on of a batch are recorded in
+    """
+    name = os.path.splitext(os.path.basename(pieces_file))[0]
+    return os.path.join(record_dir, '{}-{}x{}-{}.tgr'.format(name, length, width, first))
+
+
+def play_games(pieces_file, length, width, seed, first, count, adjacent=False, max_turns=MAX_TURNS,
+               record_dir=None):
+    """
+    Plays games number first to first + count - 1 with random policies
+    :param record_dir: directory to write the games' records to, if any
+    :return: (wins by result, Counter of game lengths)
+    """
+    game = Game(PieceSet.from_file(pieces_file), length, width, adjacent, max_turns)
+    wins = {'red': 0, 'blue': 0, DRAW: 0}
+    lengths = Counter()
+    record = None
+    if record_dir is not None:
+        record = open(record_filename(record_dir, pieces_file, length, width, first), 'wb')
+    try:
+        for index in range(first, first + count):
+            result, turns = play_game(game, game_seed(seed, index), record=record)
+            wins[result] += 1
+            lengths[turns] += 1
+    finally:
+        if record is not None:
+            record.close()
+    return wins, lengths
+
+
+def percentile(lengths, fraction):
+    """
+    Returns a percentile of the values counted in a Counter
+    """
+    total = sum(lengths.values())
+    seen = 0
+    for value in sorted(lengths):
+        seen += lengths[value]
+        if seen > fraction * total:
+            return value
+    return max(lengths, default=0)
+
+
+def run_batch(pieces_file, length, width, games, seed=0, workers=None, adjacent=False,
+              max_turns=MAX_TURNS, chunk=CHUNK_GAMES, record_dir=None):
+    """
+    Plays games with random policies across a process pool
+    :param record_dir: directory to write the games' records to, one file per task, if any
+    :return: dictionary of win rates, game length percentiles and games per second
+    """
+    if games < 1:
+        raise ValueError("A batch needs at least one game")
+    wins = {'red': 0, 'blue': 0, DRAW: 0}
+    # games of each length, so memory doesn't grow with the number of games
+    lengths = Counter()
+    start = time.perf_counter()
+    firsts = range(0, games, chunk)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        tasks = [executor.submit(play_games, pieces_file, length, width, seed, first,
+                                 min(chunk, games - first), adjacent, max_turns, record_dir)
+                 for first in firsts]
+        for task in tasks:
+            chunk_wins, chunk_lengths = task.result()
+            for result, count in chunk_wins.items():
+                wins[result] += count
+            lengths.update(chunk_lengths)
+    seconds = time.perf_counter() - start
+    return {
+        'pieces': os.path.basename(pieces_file),
+        'size': '{}x{}'.format(length, width),
+        'games': games,
+        'red_win_rate': wins['red'] / games,
+        'blue_win_rate': wins['blue'] / games,
+        'draw_rate': wins[DRAW] / games,
+        'length_mean': sum(turns * count for turns, count in lengths.items()) / games,
+        'length_p10': percentile(lengths, 0.10),
+        'length_p50': percentile(lengths, 0.50),
+        'length_p90': percentile(lengths, 0.90),
+        'length_max': max(lengths),
+        'seconds': seconds,
+        'games_per_second': games / seconds,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play Tactego games between random players.')
+    parser.add_argument('--pieces', nargs='+', default=['basic.pieces.txt', 'small_game.pieces.txt',
+                                                        'assassins.pieces.txt'])
+    parser.add_argument('--sizes', nargs='+', default=['10x10'], help='board sizes, LENGTHxWIDTH')
+    parser.add_argument('--games', type=int, default=10000, help='games per pieces file and size')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', default='0')
+    parser.add_argument('--adjacent', action='store_true', help='pieces move one square at a time')
+    parser.add_argument('--max-turns', type=int, default=MAX_TURNS)
+    parser.add_argument('--record', metavar='DIR', help='write the records of the games to DIR')
+    args = parser.parse_args()
+    if args.record:
+        os.makedirs(args.record, exist_ok=True)
+
+    for pieces_file in args.pieces:
+        for size in args.sizes:
+            length, width = (int(n) for n in size.lower().split('x'))
+            stats = run_batch(pieces_file, length, width, args.games, args.seed, args.workers,
+                              args.adjacent, args.max_turns, record_dir=args.record)
+            print('{pieces:<22} {size:>7}  red {red_win_rate:6.1%}  blue {blue_win_rate:6.1%}  '
+                  'draw {draw_rate:5.1%}  length p10/p50/p90 {length_p10}/{length_p50}/{length_p90} '
+                  'max {length_max}  {games_per_second:8.0f} games/s'.format(**stats))
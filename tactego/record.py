@@ -0,0 +1,254 @@
+"""
+File:    record.py
+Description:
+Compact binary records of Tactego games, and a tool to replay them.
+
+A record starts with a header: the seed, the SHA-256 of the pieces file, the board length
+and width, the piece types and how many of each, and the keyframe interval. Then come
+chunks, each a keyframe followed by up to interval moves. A keyframe is the position before
+the chunk's first move, stored as the squares holding a piece and their values, so it costs
+a few bytes per piece whatever the size of the board. A move is two square numbers
+(row * width + col), two bytes each when the board has at most 65536 squares and four
+otherwise. A chunk header of two zeros ends the record. Integers are little-endian.
+
+Any number of records can follow each other in one file, a batch of self-play games is
+written that way. To get the position after n moves, GameRecord.position starts from the
+keyframe of the chunk holding move n and replays at most interval moves.
+
+Usage: python record.py FILE [--game N] [--move M]
+"""
+import argparse
+import struct
+import sys
+from array import array
+
+from board import Board, PieceSet, RED, BLUE
+
+MAGIC = b'TGR1'
+# moves between keyframes
+KEYFRAME_INTERVAL = 128
+# length, width, keyframe interval, pieces file digest
+HEADER = struct.Struct('<HHI32s')
+# moves in the chunk, pieces in its keyframe
+CHUNK = struct.Struct('<II')
+LENGTH = struct.Struct('<H')
+NAME = struct.Struct('<B')
+
+
+def square_type(length, width):
+    """
+    Returns the array type code square numbers of a board are stored as
+    """
+    return 'H' if length * width <= 1 << 16 else 'I'
+
+
+def _little_endian(values):
+    # array of values as little-endian bytes
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_little_endian(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+class RecordWriter:
+    """
+    This class writes the record of one game to a binary file. It is made when the board is
+    set up and told each move after it is played
+    """
+    def __init__(self, file, board, seed, interval=KEYFRAME_INTERVAL):
+        """
+        :param file: binary file to write to, it may already hold other records
+        :param board: the game board, as set up
+        :param seed: the seed the game was set up with
+        """
+        self.file = file
+        self.board = board
+        self.interval = interval
+        self.squares = square_type(board.length, board.width)
+        self.moves = array(self.squares)
+        self.keyframe = self._keyframe()
+        # whether a chunk was written, the first one is written even without moves
+        self.written = False
+        pieces = board.pieces
+        seed = str(seed).encode()
+        header = [MAGIC, HEADER.pack(board.length, board.width, interval, pieces.digest),
+                  LENGTH.pack(len(seed)), seed, LENGTH.pack(len(pieces.names) - 1)]
+        for name, count in zip(pieces.names[1:], pieces.counts[1:]):
+            name = name.encode()
+            header += [NAME.pack(len(name)), name, LENGTH.pack(count)]
+        file.write(b''.join(header))
+
+    def _keyframe(self):
+        # the squares holding a piece and their values, from the board's piece positions
+        squares = sorted(self.board.positions[RED] + self.board.positions[BLUE])
+        cells = self.board.cells
+        return array(self.squares, squares), array('b', (cells[square] for square in squares))
+
+    def add(self, move):
+        """
+        Method to record a move, once it has been played on the board
+        :param move: tuple containing start and stop positions
+        """
+        (start_row, start_col), (stop_row, stop_col) = move
+        width = self.board.width
+        self.moves.append(start_row * width + start_col)
+        self.moves.append(stop_row * width + stop_col)
+        if len(self.moves) == 2 * self.interval:
+            self._write_chunk()
+            self.keyframe = self._keyframe()
+
+    def _write_chunk(self):
+        squares, values = self.keyframe
+        self.file.write(b''.join([CHUNK.pack(len(self.moves) // 2, len(squares)), _little_endian(squares),
+                                  values.tobytes(), _little_endian(self.moves)]))
+        del self.moves[:]
+        self.written = True
+
+    def close(self):
+        """
+        Method to end the record, after the last move. The file is left open
+        """
+        if self.moves or not self.written:
+            self._write_chunk()
+        self.file.write(CHUNK.pack(0, 0))
+
+
+class GameRecord:
+    """
+    This class reads one record from the bytes of a records file
+    """
+    def __init__(self, data, offset=0):
+        """
+        :param data: the bytes of the file
+        :param offset: where the record starts in data
+        """
+        if data[offset:offset + len(MAGIC)] != MAGIC:
+            raise ValueError("Not a Tactego game record")
+        self.data = data
+        offset += len(MAGIC)
+        self.length, self.width, self.interval, digest = HEADER.unpack_from(data, offset)
+        offset += HEADER.size
+        (size,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        self.seed = bytes(data[offset:offset + size]).decode()
+        offset += size
+        (types,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        counts = []
+        for _ in range(types):
+            (size,) = NAME.unpack_from(data, offset)
+            offset += NAME.size
+            name = bytes(data[offset:offset + size]).decode()
+            offset += size
+            (count,) = LENGTH.unpack_from(data, offset)
+            offset += LENGTH.size
+            counts.append((name, count))
+        self.pieces = PieceSet(counts, digest)
+        self.squares = square_type(self.length, self.width)
+        square_size = array(self.squares).itemsize
+        # (offset of the keyframe, pieces in it, offset of the moves, moves) of each chunk
+        self.chunks = []
+        self.moves = 0
+        while True:
+            moves, keyframe = CHUNK.unpack_from(data, offset)
+            offset += CHUNK.size
+            if not moves and not keyframe:
+                break
+            moves_offset = offset + keyframe * (square_size + 1)
+            self.chunks.append((offset, keyframe, moves_offset, moves))
+            self.moves += moves
+            offset = moves_offset + 2 * moves * square_size
+        # where the next record in the file starts
+        self.end = offset
+
+    def _squares(self, offset, count):
+        size = array(self.squares).itemsize
+        return _from_little_endian(self.squares, self.data[offset:offset + count * size])
+
+    def _chunk_moves(self, chunk):
+        _, _, offset, moves = chunk
+        return self._squares(offset, 2 * moves)
+
+    def moves_list(self):
+        """
+        Method returning every move of the game, as ((row, col), (row, col))
+        """
+        width = self.width
+        moves = []
+        for chunk in self.chunks:
+            squares = self._chunk_moves(chunk)
+            moves += [(divmod(squares[i], width), divmod(squares[i + 1], width))
+                      for i in range(0, len(squares), 2)]
+        return moves
+
+    def position(self, move=None):
+        """
+        Method returning the board after a number of moves, the end of the game by default.
+        It starts from the nearest keyframe at or before that move
+        """
+        if move is None or move > self.moves:
+            move = self.moves
+        index = min(move // self.interval, len(self.chunks) - 1)
+        offset, keyframe, _, _ = self.chunks[index]
+        board = Board(self.length, self.width, self.pieces)
+        squares = self._squares(offset, keyframe)
+        offset += keyframe * squares.itemsize
+        values = array('b', bytes(self.data[offset:offset + keyframe]))
+        for square, value in zip(squares, values):
+            board.cells[square] = value
+        board.recount()
+        moves = self._chunk_moves(self.chunks[index])
+        for i in range(0, 2 * (move - index * self.interval), 2):
+            board.make(moves[i], moves[i + 1])
+        return board
+
+
+def read_records(data):
+    """
+    Generates the records held in the bytes of a records file, in order
+    """
+    data = memoryview(data)
+    offset = 0
+    while offset < len(data):
+        record = GameRecord(data, offset)
+        yield record
+        offset = record.end
+
+
+def load_records(filename):
+    """
+    Returns the records of a file as a list
+    """
+    with open(filename, 'rb') as file:
+        return list(read_records(file.read()))
+
+
+if __name__ == '__main__':
+    from tactego import draw_board, get_winner
+
+    parser = argparse.ArgumentParser(description='Replay recorded Tactego games.')
+    parser.add_argument('file')
+    parser.add_argument('--game', type=int, help='game to show, by number in the file from 0')
+    parser.add_argument('--move', type=int, help='show the board after this many moves')
+    args = parser.parse_args()
+
+    records = load_records(args.file)
+    if args.game is None:
+        for number, record in enumerate(records):
+            print('{:>6}  seed {!r}  {}x{}  {} moves  winner {}'.format(
+                number, record.seed, record.length, record.width, record.moves,
+                get_winner(record.position()) or 'none'))
+    else:
+        record = records[args.game]
+        print('seed {!r}, pieces {}, {}x{}, {} moves'.format(
+            record.seed, record.pieces.digest.hex(), record.length, record.width, record.moves))
+        board = record.position(args.move)
+        draw_board(board)
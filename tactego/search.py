@@ -0,0 +1,426 @@
+"""
+File:    search.py
+Description:
+Computer player for Tactego. The computer doesn't read the types of enemy pieces it hasn't
+seen: its view of the board marks them UNKNOWN, and it keeps the number of each enemy type
+still unaccounted for. It searches that view with expectiminimax: it picks its best move, the
+enemy picks the move worst for it, and attacking an unknown piece is a chance node weighted
+by the unaccounted types. Moves are played and taken back on one board (make/unmake),
+positions are Zobrist hashed into a fixed size transposition table, and iterative deepening
+stops when the time budget for the move runs out.
+
+When pieces may move to any square, as in tactego(), two pieces of the same type are as good
+as each other wherever they stand, so only one move per attacking type and target type is
+searched, which keeps the tree small enough to look a few moves ahead.
+"""
+import random
+import time
+
+from board import EMPTY, UNKNOWN
+
+# score of a won position, a lost one scores -WIN. The remaining depth is added, so the
+# search prefers quicker wins and slower losses
+WIN = 1000000
+# seconds the computer thinks about a move
+TIME_BUDGET = 1.0
+# slots in the transposition table, each holding one position
+TABLE_SIZE = 1 << 18
+MAX_DEPTH = 64
+# nodes searched between looks at the clock
+CLOCK_NODES = 1024
+# seed of the Zobrist keys
+ZOBRIST_SEED = 20231129
+
+
+class OutOfTime(Exception):
+    """
+    Raised inside the search when the time budget is spent
+    """
+
+
+class TranspositionTable:
+    """
+    This class remembers searched positions in a fixed number of slots, picked by the low bits
+    of the position's hash. A slot holds (key, depth, value, best move, generation). A new
+    entry replaces the one in its slot if the slot holds the same position, an entry from an
+    earlier move's search, or an entry searched no deeper, so memory never grows
+    """
+    def __init__(self, size=TABLE_SIZE):
+        self.size = size
+        self.slots = [None] * size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def new_search(self):
+        """
+        Method to start the search for a new move, entries from earlier ones become the
+        first to be replaced
+        """
+        self.generation += 1
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, key, depth):
+        """
+        Method returning the entry for a position, or None. It counts as a hit when the entry
+        was searched at least depth deep, so its value can be used as it is
+        """
+        self.probes += 1
+        entry = self.slots[key % self.size]
+        if entry is None or entry[0] != key:
+            return None
+        if entry[1] >= depth:
+            self.hits += 1
+        return entry
+
+    def store(self, key, depth, value, move):
+        slot = key % self.size
+        entry = self.slots[slot]
+        if entry is None or entry[0] == key or entry[4] != self.generation or depth >= entry[1]:
+            self.slots[slot] = (key, depth, value, move, self.generation)
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+
+class ComputerPlayer:
+    """
+    This class chooses moves for one player. observe must see every move of the game, before
+    it is played, to follow which enemy pieces have been revealed in fights
+    """
+    def __init__(self, pieces, side, adjacent=False, time_budget=TIME_BUDGET, table_size=TABLE_SIZE):
+        """
+        :param pieces: the PieceSet of the game
+        :param side: RED or BLUE
+        :param adjacent: pieces move one square at a time instead of anywhere
+        """
+        self.pieces = pieces
+        self.side = side
+        self.adjacent = adjacent
+        self.time_budget = time_budget
+        self.table = TranspositionTable(table_size)
+        self.values = pieces.values
+        # enemy pieces seen in a fight and still on the board: position -> code
+        self.known = {}
+        # enemy pieces captured, by code
+        self.lost = [0] * len(pieces.names)
+        self.keys = {}
+        self.key_source = random.Random(ZOBRIST_SEED)
+        self.side_key = self.key_source.getrandbits(64)
+        # statistics of the last search
+        self.stats = {}
+        # search state
+        self.cells = None
+        self.width = 0
+        self.length = 0
+        self.pool = None
+        self.hash = 0
+        self.material = 0
+        self.own_flags = 0
+        self.enemy_flags = 0
+        self.nodes = 0
+        self.deadline = 0.0
+
+    def observe(self, board, move):
+        """
+        Method to follow a move of either player, called before the move is played on board
+        """
+        start, stop = board.index(*move[0]), board.index(*move[1])
+        piece = board.cells[start]
+        defender = board.cells[stop]
+        enemy = -self.side
+        if defender == EMPTY:
+            if start in self.known:
+                self.known[stop] = self.known.pop(start)
+            return
+        attacker_wins = self.pieces.attacker_wins(abs(piece), abs(defender))
+        if piece * enemy > 0:
+            self.known.pop(start, None)
+            if attacker_wins:
+                self.known[stop] = abs(piece)
+            else:
+                self.lost[abs(piece)] += 1
+        elif defender * enemy > 0:
+            if attacker_wins:
+                self.known.pop(stop, None)
+                self.lost[abs(defender)] += 1
+            else:
+                self.known[stop] = abs(defender)
+
+    def _key(self, position, value):
+        # Zobrist key of a value on a square, made the first time it is needed
+        index = position * 256 + value
+        key = self.keys.get(index)
+        if key is None:
+            key = self.keys[index] = self.key_source.getrandbits(64)
+        return key
+
+    def _pool_key(self, code, count):
+        # Zobrist key of the number of unaccounted enemy pieces of a type
+        index = ('pool', code, count)
+        key = self.keys.get(index)
+        if key is None:
+            key = self.keys[index] = self.key_source.getrandbits(64)
+        return key
+
+    def _load(self, board):
+        # set up the search state from the computer's view of board
+        enemy = -self.side
+        flag = self.pieces.flag
+        cells = self.cells = board.cells[:]
+        self.length = board.length
+        self.width = board.width
+        pool = self.pool = [count - lost for count, lost in zip(self.pieces.counts, self.lost)]
+        for code in self.known.values():
+            pool[code] -= 1
+        self.hash = 0
+        self.material = 0
+        self.own_flags = 0
+        self.enemy_flags = pool[flag] if flag else 0
+        for position, value in enumerate(cells):
+            if value == EMPTY:
+                continue
+            if value * enemy > 0:
+                if position in self.known:
+                    self.material -= self.values[abs(value)]
+                    self.enemy_flags += flag and abs(value) == flag
+                else:
+                    value = cells[position] = enemy * UNKNOWN
+            else:
+                self.material += self.values[abs(value)]
+                self.own_flags += flag and abs(value) == flag
+            self.hash ^= self._key(position, value)
+        for code, count in enumerate(pool):
+            if count:
+                self.material -= count * self.values[code]
+                self.hash ^= self._pool_key(code, count)
+        if not flag:
+            # without flags the game is only won by leaving the other player no move
+            self.own_flags = self.enemy_flags = 1
+
+    def _make(self, start, stop, attacker, defender):
+        """
+        Plays a move in the search view. attacker and defender are the types an unknown piece
+        at start or stop turns out to have, 0 when the piece there isn't unknown
+        :return: what _unmake needs to take the move back
+        """
+        cells = self.cells
+        piece = cells[start]
+        target = cells[stop]
+        undo = (start, stop, piece, target, attacker, defender, self.hash, self.material,
+                self.own_flags, self.enemy_flags)
+        key = self._key
+        hash = self.hash ^ key(start, piece)
+        cells[start] = EMPTY
+        if target == EMPTY:
+            cells[stop] = piece
+            self.hash = hash ^ key(stop, piece)
+            return undo
+        sign = 1 if piece > 0 else -1
+        pool = self.pool
+        for code in (attacker, defender):
+            if code:
+                hash ^= self._pool_key(code, pool[code])
+                pool[code] -= 1
+                if pool[code]:
+                    hash ^= self._pool_key(code, pool[code])
+        attacker = attacker or abs(piece)
+        defender = defender or abs(target)
+        hash ^= key(stop, target)
+        if self.pieces.beats[attacker][defender]:
+            survivor = sign * attacker
+            loser, loser_owner = defender, -sign
+        else:
+            survivor = -sign * defender
+            loser, loser_owner = attacker, sign
+        cells[stop] = survivor
+        self.hash = hash ^ key(stop, survivor)
+        is_flag = loser == self.pieces.flag
+        if loser_owner == self.side:
+            self.material -= self.values[loser]
+            self.own_flags -= is_flag
+        else:
+            self.material += self.values[loser]
+            self.enemy_flags -= is_flag
+        return undo
+
+    def _unmake(self, undo):
+        (start, stop, piece, target, attacker, defender, self.hash, self.material,
+         self.own_flags, self.enemy_flags) = undo
+        self.cells[start] = piece
+        self.cells[stop] = target
+        if attacker:
+            self.pool[attacker] += 1
+        if defender:
+            self.pool[defender] += 1
+
+    def _moves(self, player):
+        """
+        Method returning the moves of player in the search view, as (start, stop, attacker)
+        where attacker is the type an unknown enemy piece attacks as, fights first
+        """
+        cells = self.cells
+        flag = self.pieces.flag
+        unknown = player * UNKNOWN
+        # types an unknown enemy piece may attack as, the enemy chooses
+        hidden = [code for code, count in enumerate(self.pool) if count and code != flag]
+        fights = []
+        quiet = []
+        if self.adjacent:
+            width = self.width
+            last = len(cells) - width
+            for start, value in enumerate(cells):
+                if value * player <= 0 or abs(value) == flag or (value == unknown and not hidden):
+                    continue
+                col = start % width
+                for stop in (start - width if start >= width else -1, start + width if start < last else -1,
+                             start - 1 if col else -1, start + 1 if col < width - 1 else -1):
+                    if stop < 0 or cells[stop] * player > 0:
+                        continue
+                    if cells[stop] == EMPTY:
+                        quiet.append((start, stop, 0))
+                    elif value == unknown:
+                        fights.extend((start, stop, code) for code in hidden)
+                    else:
+                        fights.append((start, stop, 0))
+            return fights + quiet
+
+        # pieces can go anywhere: one piece per type attacks one piece per type
+        attackers = {}
+        targets = {}
+        empty = -1
+        for position, value in enumerate(cells):
+            if value == EMPTY:
+                if empty < 0:
+                    empty = position
+            elif value * player > 0:
+                if abs(value) != flag and value not in attackers:
+                    attackers[value] = position
+            elif value not in targets:
+                targets[value] = position
+        if unknown in attackers and not hidden:
+            del attackers[unknown]
+        if -unknown in targets and not sum(self.pool):
+            del targets[-unknown]
+        for value, start in attackers.items():
+            for stop in targets.values():
+                if value == unknown:
+                    fights.extend((start, stop, code) for code in hidden)
+                else:
+                    fights.append((start, stop, 0))
+        if empty >= 0 and attackers:
+            # moving to an empty square changes nothing but the square, one stands for all
+            quiet.append((next(iter(attackers.values())), empty, 0))
+        return fights + quiet
+
+    def _search(self, player, depth):
+        """
+        Method returning the value for the computer of the search view with player to move
+        """
+        self.nodes += 1
+        if not self.nodes % CLOCK_NODES and time.perf_counter() > self.deadline:
+            raise OutOfTime
+        if not self.own_flags:
+            return -WIN - depth
+        if not self.enemy_flags:
+            return WIN + depth
+        if not depth:
+            return self.material
+        key = self.hash if player == self.side else self.hash ^ self.side_key
+        entry = self.table.probe(key, depth)
+        if entry is not None and entry[1] >= depth:
+            return entry[2]
+        moves = self._moves(player)
+        if not moves:
+            # a player who can't move loses
+            return -WIN - depth if player == self.side else WIN + depth
+        if entry is not None and entry[3] in moves:
+            moves.remove(entry[3])
+            moves.insert(0, entry[3])
+        maximize = player == self.side
+        best = None
+        best_move = None
+        for move in moves:
+            value = self._value(move, player, depth - 1)
+            if best is None or (value > best if maximize else value < best):
+                best = value
+                best_move = move
+        self.table.store(key, depth, best, best_move)
+        return best
+
+    def _value(self, move, player, depth):
+        # value of a move, averaged over the types an unknown piece it attacks may have
+        start, stop, attacker = move
+        if self.cells[stop] == -player * UNKNOWN:
+            pool = self.pool
+            total = sum(pool)
+            value = 0
+            for code, count in enumerate(pool):
+                if count:
+                    undo = self._make(start, stop, 0, code)
+                    value += count * self._search(-player, depth)
+                    self._unmake(undo)
+            return value / total
+        undo = self._make(start, stop, attacker, 0)
+        value = self._search(-player, depth)
+        self._unmake(undo)
+        return value
+
+    def choose_move(self, board):
+        """
+        Method to search for the computer's move, deepening until the time budget runs out.
+        The statistics of the search are left in stats
+        :return: the move, a tuple containing start and stop positions, or None if there is none
+        """
+        started = time.perf_counter()
+        self.deadline = started + self.time_budget
+        self._load(board)
+        self.table.new_search()
+        self.nodes = 0
+        moves = self._moves(self.side)
+        best = moves[0] if moves else None
+        value = 0
+        reached = 0
+        try:
+            for depth in range(1, MAX_DEPTH + 1):
+                if best is None:
+                    break
+                # the best move so far is searched first
+                moves.remove(best)
+                moves.insert(0, best)
+                depth_best = None
+                depth_value = None
+                for move in moves:
+                    move_value = self._value(move, self.side, depth - 1)
+                    if depth_value is None or move_value > depth_value:
+                        depth_value, depth_best = move_value, move
+                if depth_value <= -WIN and reached:
+                    # every move loses against perfect play, keep the move that was best
+                    # before the loss was seen, the enemy may not find it
+                    break
+                best, value, reached = depth_best, depth_value, depth
+                if value >= WIN:
+                    # the win is forced
+                    break
+        except OutOfTime:
+            pass
+        seconds = time.perf_counter() - started
+        self.stats = {
+            'depth': reached,
+            'value': value,
+            'nodes': self.nodes,
+            'seconds': seconds,
+            'nodes_per_second': self.nodes / seconds if seconds else 0.0,
+            'tt_hit_rate': self.table.hit_rate(),
+        }
+        if best is None:
+            return None
+        return divmod(best[0], self.width), divmod(best[1], self.width)
+
+    def report(self):
+        """
+        Method returning a line about the last search
+        """
+        return ('depth {depth}, {nodes} nodes in {seconds:.2f}s, {nodes_per_second:.0f} nodes/s, '
+                'TT hit rate {tt_hit_rate:.1%}'.format(**self.stats))
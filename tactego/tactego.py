@@ -7,58 +7,76 @@ E-mail:  so01811@umbc.edu
 Description:
 Project 2:
 Simplified version of the game Stratego named Tactego. Program open and reads
-files which includes element that will be used to draw the board, made by 2d list.
+files which includes element that will be used to draw the board, kept as a compact
+array of piece codes (see board.py) and drawn through its string view.
 The goal of the game is to capture enemy flag, once this happens, program will print the
 winner and end game.
 """
+import argparse
 import random
+from array import array
+
+from board import Board, PieceSet, RED, BLUE, PLAYERS
+from record import RecordWriter
+from search import ComputerPlayer, TIME_BUDGET
+
+# file the game is recorded in when tactego.py is run
+RECORD_FILE = 'tactego.tgr'
+
+
 def initialize_board(length, width, pieces_file):
     """
     Initialize the game board based on given parameters and piece file
     :param length: length of the board
     :param width: the width of the board
     :param pieces_file: file containing information about pieces
-    :return: the game board, a 2d List representing
+    :return: the game board, a Board
     """
-    total_cells = length * width
-    red_pieces = []
-    blue_pieces = []
-    board = [['' for _ in range(width)] for _ in range(length)]
-
     # read the file and process the pieces
-    with open(pieces_file, 'r') as file:
-        lines = file.readlines()
-        # iterate through lines of the file
-        for line in lines:
-            line = line.strip().split()
-            if len(line) == 2:
-                num_pieces = int(line[1])
-                # extend each pieces list with red player or blue player pieces from file
-                # denote with prefixed letter
-                red_pieces.extend([f"R{line[0]}"] * num_pieces)
-                blue_pieces.extend([f"B{line[0]}"] * num_pieces)
+    pieces = PieceSet.from_file(pieces_file)
     # check if board can fit all pieces
-    if len(red_pieces) > total_cells / 2:
+    if len(pieces.army()) > length * width / 2:
         print("Warning! The size of the board is too small for the number of pieces")
         print("The game may be invalid.")
+    return setup_board(length, width, pieces)
+
+
+def setup_board(length, width, pieces, rng=random):
+    """
+    Places both players' shuffled pieces on a new board
+    :param pieces: the PieceSet to draw the pieces from
+    :param rng: source of randomness, the random module (seeded by the game) by default
+    :return: the game board, a Board
+    """
+    total_cells = length * width
+    board = Board(length, width, pieces)
+    # each player gets the pieces in the order the file lists them, by code
+    red_pieces = pieces.army()
+    blue_pieces = pieces.army()
 
     # shuffle pieces for both players
-    random.shuffle(red_pieces)
-    random.shuffle(blue_pieces)
-
-    # add red player pieces to board
-    for i in range(length):
-        for j in range(width):
-            if len(red_pieces) != 0:
-                board[i][j] = red_pieces.pop()
-    # add blue player pieces to the board
+    rng.shuffle(red_pieces)
+    rng.shuffle(blue_pieces)
+
+    # add red player pieces to board, from the top left, last piece first
+    cells = board.cells
+    count = min(len(red_pieces), total_cells)
+    cells[:count] = array('b', (RED * code for code in reversed(red_pieces[-count:] if count else [])))
+    # add blue player pieces to the board, row by row from the bottom
+    blue_pieces.reverse()
+    placed = 0
     for i in range(length - 1, -1, -1):
-        for j in range(width):
-            if len(blue_pieces) != 0:
-                board[i][j] = blue_pieces.pop()
+        if placed == len(blue_pieces):
+            break
+        row = blue_pieces[placed:placed + width]
+        cells[i * width:i * width + len(row)] = array('b', (BLUE * code for code in row))
+        placed += len(row)
+    board.recount()
 
     # return initialized board
     return board
+
+
 def get_player_move(board, player):
     """
     Get the player's move from the board for a specific player
@@ -66,6 +84,19 @@ def get_player_move(board, player):
     :param player: the player whose move is being obtained
     :return: the updated game board after the player's move
     """
+    move_piece(read_player_move(board, player), board)
+    return board
+
+
+def read_player_move(board, player):
+    """
+    Ask a player for a legal move, without playing it
+    :param board: the game board
+    :param player: the player whose move is being obtained
+    :return: the move, a tuple containing start and stop positions
+    """
+    # sign of the player's pieces on the board
+    side = PLAYERS[player]
     # use boolean flag to get the chosen piece
     is_valid_start = False
     is_valid_end = False
@@ -77,30 +108,17 @@ def get_player_move(board, player):
         # Check if the piece is valid
         indexes = start_position.strip().split(' ')
         if len(indexes) == 2:
-            if player == 'blue':
-                try:
-                    if board[int(indexes[0])][int(indexes[1])] == '':
-                        print('You must select a starting position with one of your pieces.')
-                    elif board[int(indexes[0])][int(indexes[1])][1] == 'F':
-                        print('You must select a starting position with one of your pieces. Not a flag')
-                    elif board[int(indexes[0])][int(indexes[1])][0] == 'B':
-                        start = (int(indexes[0]), int(indexes[1]))
-                        is_valid_start = True
-                    else:
-                        print('You must select a starting position with one of your pieces.')
-                except:
-                    print('You must select a starting position with one of your pieces.')
-            else:
-                try:
-                    if board[int(indexes[0])][int(indexes[1])] == '':
-                        print('You must select a starting position with one of your pieces.')
-                    elif board[int(indexes[0])][int(indexes[1])][0] == 'R':
-                        start = (int(indexes[0]), int(indexes[1]))
-                        is_valid_start = True
-                    else:
-                        print('You must select a starting position with one of your pieces.')
-                except:
+            try:
+                row, col = int(indexes[0]), int(indexes[1])
+                if board.owner(row, col) != side:
                     print('You must select a starting position with one of your pieces.')
+                elif board.is_flag(row, col):
+                    print('You must select a starting position with one of your pieces. Not a flag')
+                else:
+                    start = (row, col)
+                    is_valid_start = True
+            except (ValueError, IndexError):
+                print('You must select a starting position with one of your pieces.')
 
     # Repeat until end position is correct
     while not is_valid_end:
@@ -109,60 +127,37 @@ def get_player_move(board, player):
 
         if len(indexes) == 2:
             try:
-                valid_piece = True
-                if board[int(indexes[0])][int(indexes[1])] != '':
-                    if player == 'blue':
-                        if board[int(indexes[0])][int(indexes[1])][0] == 'B':
-                            valid_piece = False
-                    else:
-                        if board[int(indexes[0])][int(indexes[1])][0] == 'R':
-                            valid_piece = False
-
-                if not valid_piece:
+                stop = (int(indexes[0]), int(indexes[1]))
+                if board.owner(*stop) == side:
                     print(f'You must select a valid position to move your piece.')
                 else:
-                    stop = (int(indexes[0]), int(indexes[1]))
-                    board = move_piece((start, stop), board)
                     is_valid_end = True
-            except:
+            except (ValueError, IndexError):
                 print('You must select a valid position to move your piece.')
 
-    return board
+    return start, stop
 
 def move_piece(move, board):
     """
     Move a piece on the board from start position to stop position
     :param move: tuple containing start and stop positions of the move
     :param board: the game board
-    :return: updated game board after a piece is moved
+    :return: what unmake_move needs to take the move back
     """
     # get the move
     start, stop = move
 
-    # get the piece
-    piece = board[start[0]][start[1]]
+    # handle combat, the winner of a fight ends up on the stop square
+    return board.make(board.index(*start), board.index(*stop))
 
-    # get the destination
-    dest = board[stop[0]][stop[1]]
 
-    # handle combat
-    if dest == "":
-        board[stop[0]][stop[1]] = piece
-        board[start[0]][start[1]] = ""
-        return board
-    elif dest[1] == 'F':
-        board[stop[0]][stop[1]] = piece
-        board[start[0]][start[1]] = ""
-        return board
-
-    else:
-        if int(piece[1]) >= int(dest[1]):
-            board[stop[0]][stop[1]] = piece
-            board[start[0]][start[1]] = ""
-            return board
-        else:
-            board[start[0]][start[1]] = ""
-            return board
+def unmake_move(undo, board):
+    """
+    Take back a move played by move_piece
+    :param undo: what move_piece returned
+    :param board: the game board
+    """
+    board.unmake(undo)
 
 
 def get_winner(board):
@@ -171,23 +166,14 @@ def get_winner(board):
     :param board: the game board
     :return: "blue" if blue players wins, 'red' if red player wins, None if no winner
     """
+    flag = board.pieces.flag
+    # the board keeps count of each piece type, so this doesn't scan it
     # Count Red Player Flags:
-    red_flags = 0
-    for row in board:
-        for tile in row:
-            if tile == "RF":
-                red_flags += 1
-    if red_flags == 0:
+    if board.count(RED * flag) == 0:
         return 'blue'
 
     # Count Blue Player Flags
-    blue_flags = 0
-    for row in board:
-        for tile in row:
-            if tile == "BF":
-                blue_flags += 1
-
-    if blue_flags == 0:
+    if board.count(BLUE * flag) == 0:
         return "red"
 
     # if no winner
@@ -211,60 +197,105 @@ def draw_board(board):
     function to display the game board
     :param board: the board
     """
+    # the board as strings like "R7" and "BF"
+    rows = board.rows()
     # display the column numbers
     # for loop iterates the length pf the columns
     print('   ', end=' ')
-    for i in range(len(board[0])):
+    for i in range(board.width):
         print(f"{i:<5}", end=' ')
     print()
 
     # display the row numbers and the board
     # for loop iterates the length of the rows
-    for i in range(len(board)):
+    for i, row in enumerate(rows):
         print(f"  {i:<3}", end='')
-        for j in range(len(board[i])):
-            print(f"{board[i][j]:<5}", end=' ')
+        for label in row:
+            print(f"{label:<5}", end=' ')
         print()
 
 
-def tactego(pieces_file, length, width):
+def tactego(pieces_file, length, width, computer=None, think_time=TIME_BUDGET, record_file=None,
+            seed=None):
     """
     The game loop for Tactego
     :param pieces_file: file containing information about pieces
     :param length: the length of the game board
     :param width: the width of the game board
+    :param computer: 'red' or 'blue' for the player the computer plays, None for two people
+    :param think_time: seconds the computer may think about each move
+    :param record_file: file to add the game's record to (see record.py), None for no record
+    :param seed: the seed random was given, kept in the record
     """
     # initial the game board
     board = initialize_board(length, width, pieces_file)
     player = 'red'
+    computer_player = None
+    if computer is not None:
+        computer_player = ComputerPlayer(board.pieces, PLAYERS[computer], time_budget=think_time)
+    record = None
+    writer = None
+    if record_file is not None:
+        # a records file holds any number of games, so earlier ones are kept
+        record = open(record_file, 'ab')
+        writer = RecordWriter(record, board, seed if seed is not None else '')
 
     # boolean flag for the game being over
     game_is_over = False
 
-    while not game_is_over:
-        # draw the board
-        draw_board(board)
-        # Get player move, move the pieces and handle combat
-        board = get_player_move(board, player)
-
-        # switch player
-        player = switch_player(player)
-
-        # check for a winner
-        winner = get_winner(board)
-
-        # if winner case
-        if winner != None:
-            if winner == 'red':
-                print("R has won the game")
+    try:
+        while not game_is_over:
+            # draw the board
+            draw_board(board)
+            # Get player move, move the pieces and handle combat
+            if player == computer:
+                move = computer_player.choose_move(board)
+                if move is None:
+                    # the computer has no piece that can move
+                    winner = switch_player(player)
+                else:
+                    (start_row, start_col), (stop_row, stop_col) = move
+                    print(f"Computer moves {start_row} {start_col} to {stop_row} {stop_col} "
+                          f"({computer_player.report()})")
             else:
-                print("B has won the game")
-            game_is_over = True
+                move = read_player_move(board, player)
+            if move is not None:
+                if computer_player is not None:
+                    computer_player.observe(board, move)
+                move_piece(move, board)
+                if writer is not None:
+                    writer.add(move)
+
+                # check for a winner
+                winner = get_winner(board)
+
+            # switch player
+            player = switch_player(player)
+
+            # if winner case
+            if winner != None:
+                if winner == 'red':
+                    print("R has won the game")
+                else:
+                    print("B has won the game")
+                game_is_over = True
+    finally:
+        # a game left before the end is recorded up to its last move
+        if record is not None:
+            writer.close()
+            record.close()
 
 # main method
 if __name__ == "__main__":
-    random.seed(input("What is the seed?"))
+    parser = argparse.ArgumentParser(description='Play Tactego.')
+    parser.add_argument('--computer', choices=('red', 'blue'), help='the player the computer plays')
+    parser.add_argument('--think', type=float, default=TIME_BUDGET, help='seconds per computer move')
+    parser.add_argument('--record', default=RECORD_FILE,
+                        help='file to record the game in, replayed with record.py (default %(default)s)')
+    args = parser.parse_args()
+    seed = input("What is the seed?")
+    random.seed(seed)
     file_name = input("What is the filename for the pieces?")
     length = int(input("What is the length?"))
     width = int(input("What is the width?"))
-    tactego(file_name, length, width)
+    tactego(file_name, length, width, args.computer, args.think, args.record or None, seed)
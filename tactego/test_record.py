@@ -0,0 +1,63 @@
+"""
+File:    test_record.py
+Description:
+Checks that game records replay to the boards the games went through.
+"""
+import io
+import os
+import unittest
+
+from board import PieceSet
+from engine import Game, play_game
+from record import RecordWriter, read_records
+
+PIECES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'small_game.pieces.txt')
+
+
+def play(game, seed, interval, file):
+    # play a random game, recording it, and return the moves and the board after each one
+    board = game.reset(seed)
+    writer = RecordWriter(file, board, seed, interval)
+    moves = []
+    boards = [board.copy()]
+    while game.result is None:
+        move = game.random_move(game.rng)
+        game.step(move)
+        writer.add(move)
+        moves.append(move)
+        boards.append(game.board.copy())
+    writer.close()
+    return moves, boards
+
+
+class RecordTest(unittest.TestCase):
+    def test_positions_replay_the_game(self):
+        game = Game(PieceSet.from_file(PIECES_FILE), 8, 8, max_turns=300)
+        file = io.BytesIO()
+        seeds = ('b', 'c', 'g')
+        # keyframes every few moves, so positions are rebuilt from several of them
+        games = [play(game, seed, interval, file) for seed, interval in zip(seeds, (5, 16, 1))]
+        records = list(read_records(file.getvalue()))
+        self.assertEqual(len(records), len(games))
+        for record, seed, (moves, boards) in zip(records, seeds, games):
+            self.assertEqual(record.seed, seed)
+            self.assertGreater(len(moves), 16)
+            self.assertEqual(record.moves_list(), moves)
+            for move, board in enumerate(boards):
+                position = record.position(move)
+                self.assertEqual(position.cells, board.cells)
+                self.assertEqual(position.tally, board.tally)
+                self.assertEqual(position.material, board.material)
+            self.assertEqual(record.position().cells, boards[-1].cells)
+
+    def test_records_from_play_game_follow_each_other(self):
+        game = Game(PieceSet.from_file(PIECES_FILE), 6, 6, max_turns=200)
+        file = io.BytesIO()
+        results = [play_game(game, seed, record=file) for seed in ('0-0', '0-1')]
+        records = list(read_records(file.getvalue()))
+        self.assertEqual([record.seed for record in records], ['0-0', '0-1'])
+        self.assertEqual([record.moves for record in records], [turns for _, turns in results])
+
+
+if __name__ == '__main__':
+    unittest.main()